@@ -193,11 +193,15 @@ class CompanyInfoAdmin(admin.ModelAdmin):
 @admin.register(PageVisit)
 class PageVisitAdmin(admin.ModelAdmin):
     list_display = ['page', 'action', 'product', 'ip_address', 'referrer', 'timestamp']
-    list_filter = ['page', 'action', 'timestamp']
-    search_fields = ['ip_address', 'user_agent', 'referrer', 'session_id']
+    list_filter = ['page', 'action', 'user_agent__is_bot', 'user_agent__device_type', 'timestamp']
+    # Referrers are matched on the small Referrer table, not scanned per visit
+    search_fields = ['ip_address', 'session_id', 'referrer__host']
+    list_select_related = ['product', 'referrer']
     readonly_fields = ['page', 'action', 'ip_address', 'user_agent', 'referrer', 'timestamp', 'session_id', 'product']
     date_hierarchy = 'timestamp'
     ordering = ['-timestamp']
+    # Skip the unfiltered COUNT(*) on every search
+    show_full_result_count = False
 
 class BrochureAdmin(admin.ModelAdmin):
     list_display = ['title', 'is_active', 'created_at']
@@ -0,0 +1,109 @@
+"""
+Catalogue versioning helpers.
+
+Version counters live in the Django cache and are bumped whenever the rows
+they describe change. Per-process caches and indexes compare the version they
+were built against with the current one to know when to rebuild. The time of
+the last bump is kept next to each counter, so HTTP responses can send a
+Last-Modified that moves on when rows are deleted.
+"""
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOGUE_VERSION_KEY = 'catalogue_version'
+
+# Per-process backends: a version bump only reaches the worker that made it
+LOCAL_CACHE_BACKENDS = ('LocMemCache', 'DummyCache')
+
+
+def cache_is_shared() -> bool:
+    """True when every worker sees the same default cache (e.g. Redis)"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return not backend.endswith(LOCAL_CACHE_BACKENDS)
+
+
+def versioned_cache_timeout(timeout):
+    """
+    Timeout for an entry keyed on a version counter.
+
+    With a per-process cache, other workers never see the bump, so entries
+    are capped at LOCAL_CACHE_MAX_TIMEOUT (5 minutes by default), the same
+    staleness bound the chatbot indexes use.
+    """
+    if cache_is_shared():
+        return timeout
+    limit = getattr(settings, 'LOCAL_CACHE_MAX_TIMEOUT', 300)
+    return limit if timeout is None else min(timeout, limit)
+
+
+def get_version(key: str) -> int:
+    """Return the current value of a version counter, initialising it if missing"""
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a flushed cache never reuses an old version
+        version = int(time.time())
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(key: str) -> int:
+    """Move a version counter on, invalidating everything built against it"""
+    cache.set(f'{key}_bumped_at', int(time.time()), versioned_cache_timeout(None))
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key missing (first write or evicted)
+        version = int(time.time())
+        cache.set(key, version, None)
+        return version
+
+
+def get_version_bumped_at(key: str) -> int:
+    """
+    Unix time of the last bump of a version counter, for Last-Modified.
+
+    Seeded from the clock when unknown (never bumped or evicted), so it errs
+    late. With a per-process cache, a bump made in another worker shows up
+    once this worker's record expires, within LOCAL_CACHE_MAX_TIMEOUT.
+    """
+    bumped_at = cache.get(f'{key}_bumped_at')
+    if bumped_at is None:
+        bumped_at = int(time.time())
+        cache.add(f'{key}_bumped_at', bumped_at, versioned_cache_timeout(None))
+        bumped_at = cache.get(f'{key}_bumped_at', bumped_at)
+    return bumped_at
+
+
+def get_catalogue_version() -> int:
+    """Version of the product/vertical catalogue"""
+    return get_version(CATALOGUE_VERSION_KEY)
+
+
+def get_catalogue_changed_at() -> int:
+    """Unix time of the last catalogue change, covering deleted rows"""
+    return get_version_bumped_at(CATALOGUE_VERSION_KEY)
+
+
+def bump_catalogue_version() -> int:
+    """Invalidate everything derived from the catalogue"""
+    return bump_version(CATALOGUE_VERSION_KEY)
+
+
+SITE_CONTENT_VERSION_KEY = 'site_content_version'
+
+
+def get_site_content_version() -> int:
+    """Version of the editable site content (hero slides, features, brochures, ...)"""
+    return get_version(SITE_CONTENT_VERSION_KEY)
+
+
+def get_site_content_changed_at() -> int:
+    """Unix time of the last site content change"""
+    return get_version_bumped_at(SITE_CONTENT_VERSION_KEY)
+
+
+def bump_site_content_version() -> int:
+    """Invalidate everything derived from the site content"""
+    return bump_version(SITE_CONTENT_VERSION_KEY)
@@ -0,0 +1,132 @@
+"""
+Facet counts for catalogue browsing.
+
+One GROUP BY over the public catalogue returns a row per distinct combination
+of facet values with its product count. The rows are cached per catalogue
+version (for at most LOCAL_CACHE_MAX_TIMEOUT with a per-process cache), and
+every facet count, including "filter-as-you-click" counts that honour the
+other selected filters, is folded from them in Python without another query.
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Set
+from django.core.cache import cache
+from django.db.models import Count, Q
+from .catalogue import get_catalogue_version, versioned_cache_timeout
+from .models import Product
+
+FACETS = ['vertical', 'brand', 'stock_status', 'badge', 'origin', 'certification']
+
+
+def split_certifications(value: str) -> Set[str]:
+    return {part.strip() for part in (value or '').split(',') if part.strip()}
+
+
+def _is_id(value: str) -> bool:
+    # Length cap keeps the id within a 64-bit column
+    return value.isdecimal() and len(value) <= 18
+
+
+def parse_facet_filters(query_params) -> Dict[str, Set[str]]:
+    """Read ?brand=Amul,Everest&stock_status=in_stock style filters"""
+    selected = {}
+    for facet in FACETS:
+        values = set()
+        for raw in query_params.getlist(facet):
+            values.update(value.strip() for value in raw.split(',') if value.strip())
+        if facet == 'vertical':
+            # Canonical ids, so they match str(vertical_id) when counting; isdecimal
+            # (not isdigit) because int() rejects digits like '²'. Anything else
+            # is kept and simply matches no vertical
+            values = {str(int(value)) if _is_id(value) else value for value in values}
+        if values:
+            selected[facet] = values
+    return selected
+
+
+def filter_products(queryset, selected: Dict[str, Set[str]]):
+    """Apply selected facet values: OR within a facet, AND across facets"""
+    for facet, values in selected.items():
+        if facet == 'vertical':
+            queryset = queryset.filter(vertical_id__in=[int(v) for v in values if _is_id(v)])
+        elif facet == 'certification':
+            # Match whole entries of the comma-separated list
+            condition = Q()
+            for value in values:
+                condition |= Q(certifications__iregex=rf'(^|,)\s*{re.escape(value)}\s*(,|$)')
+            queryset = queryset.filter(condition)
+        else:
+            queryset = queryset.filter(**{f'{facet}__in': values})
+    return queryset
+
+
+def get_facet_rows() -> List[Dict]:
+    """Product counts per distinct combination of facet values (cached per catalogue version)"""
+    cache_key = f"product_facet_rows_{get_catalogue_version()}"
+    rows = cache.get(cache_key)
+    if rows is None:
+        rows = list(
+            Product.objects.filter(is_active=True, is_public=True)
+            .order_by()
+            .values('vertical_id', 'vertical__title', 'brand', 'stock_status', 'badge', 'origin', 'certifications')
+            .annotate(count=Count('id'))
+        )
+        cache.set(cache_key, rows, versioned_cache_timeout(60 * 60 * 24))
+    return rows
+
+
+def _row_values(row: Dict, facet: str) -> Set[str]:
+    if facet == 'vertical':
+        return {str(row['vertical_id'])}
+    if facet == 'certification':
+        return {value.lower() for value in split_certifications(row['certifications'])}
+    return {row[facet]} if row[facet] else set()
+
+
+def _matches(row: Dict, facet: str, values: Set[str]) -> bool:
+    if facet == 'certification':
+        values = {value.lower() for value in values}
+    return bool(_row_values(row, facet) & values)
+
+
+def compute_facets(selected: Dict[str, Set[str]] = None) -> Dict[str, List[Dict]]:
+    """
+    Counts for every facet value. Each facet is counted with the filters of
+    the *other* facets applied, so selecting a brand still shows the counts
+    for the remaining brands.
+    """
+    selected = selected or {}
+    rows = get_facet_rows()
+    result = {}
+
+    for facet in FACETS:
+        others = {f: v for f, v in selected.items() if f != facet}
+        chosen = {value.lower() for value in selected.get(facet, ())}
+        counts = Counter()
+        labels = {}
+        for row in rows:
+            if not all(_matches(row, f, v) for f, v in others.items()):
+                continue
+            if facet == 'vertical':
+                key = str(row['vertical_id'])
+                labels[key] = row['vertical__title']
+                counts[key] += row['count']
+            elif facet == 'certification':
+                # Merge case variants ("ISO 22000", "iso 22000") into one value
+                for value in split_certifications(row['certifications']):
+                    labels.setdefault(value.lower(), value)
+                    counts[value.lower()] += row['count']
+            elif row[facet]:
+                counts[row[facet]] += row['count']
+
+        entries = []
+        for key, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+            value = labels[key] if facet == 'certification' else key
+            entries.append({
+                'value': value,
+                'label': labels.get(key, value),
+                'count': count,
+                'selected': key.lower() in chosen,
+            })
+        result[facet] = entries
+    return result
@@ -0,0 +1,124 @@
+import csv
+import gzip
+import io
+import os
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.models import PageVisit, PageVisitHourly
+from api.rollups import hour_bucket, rebuild_rollups
+
+# CSV column -> PageVisit lookup
+ARCHIVE_COLUMNS = {
+    'id': 'id',
+    'timestamp': 'timestamp',
+    'page': 'page',
+    'action': 'action',
+    'product_id': 'product_id',
+    'session_id': 'session_id',
+    'ip_address': 'ip_address',
+    'user_agent': 'user_agent__user_agent',
+    'referrer_host': 'referrer__host',
+    'referrer_path': 'referrer__path',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive raw PageVisit rows older than the retention period: make sure their '
+        'hourly/daily rollups are complete, append them to a gzip CSV file and delete '
+        'them in small chunks. Safe to run while visits are being recorded.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'VISIT_RETENTION_DAYS', 90),
+            help='Keep raw visits for this many days'
+        )
+        parser.add_argument(
+            '--hourly-days', type=int, default=getattr(settings, 'VISIT_HOURLY_RETENTION_DAYS', 365),
+            help='Keep hourly rollups for this many days (daily rollups are kept forever)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows archived and deleted per transaction')
+        parser.add_argument(
+            '--archive-dir', default=getattr(settings, 'VISIT_ARCHIVE_DIR', None),
+            help='Directory for the archive files'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def write_chunk(self, path: Path, rows):
+        # Each chunk is a complete gzip member appended to the file, so an
+        # interrupted run never leaves a truncated archive; gzip -dc and
+        # Python's gzip module read the concatenated members as one file
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not path.exists():
+            writer.writerow(list(ARCHIVE_COLUMNS))
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+        with gzip.open(path, 'at', encoding='utf-8', newline='') as archive:
+            archive.write(buffer.getvalue())
+        with open(path, 'rb') as archive:
+            os.fsync(archive.fileno())
+
+    def archive(self, cutoff, chunk_size: int, archive_dir: Path) -> int:
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        path = archive_dir / f"page_visits_before_{cutoff:%Y%m%d%H}_{timezone.now():%Y%m%d%H%M%S}.csv.gz"
+        archived = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    PageVisit.objects.filter(timestamp__lt=cutoff)
+                    .order_by('id')
+                    .values_list(*ARCHIVE_COLUMNS.values())[:chunk_size]
+                )
+                if not rows:
+                    break
+                # Written before the delete commits: a failure leaves the rows in place
+                self.write_chunk(path, [
+                    [row[0], row[1].isoformat(), *row[2:]] for row in rows
+                ])
+                PageVisit.objects.filter(id__in=[row[0] for row in rows]).delete()
+            archived += len(rows)
+            self.stdout.write(f'  archived {archived} visits')
+        if archived:
+            self.stdout.write(f'Archive written to {path}')
+        return archived
+
+    def handle(self, *args, **options):
+        if options['hourly_days'] <= options['days']:
+            # Daily rollups of the archived range are re-derived from hourly rows
+            raise CommandError('--hourly-days must be greater than --days')
+
+        # Whole hours, so the rollups of the archived range are never partial
+        cutoff = hour_bucket(timezone.now() - timedelta(days=options['days']))
+        hourly_cutoff = hour_bucket(timezone.now() - timedelta(days=options['hourly_days']))
+        archive_dir = Path(options['archive_dir'] or settings.BASE_DIR.parent / 'data/archive/page_visits')
+
+        expired = PageVisit.objects.filter(timestamp__lt=cutoff)
+        oldest = expired.order_by('timestamp').values_list('timestamp', flat=True).first()
+        if options['dry_run']:
+            self.stdout.write(
+                f'Would archive {expired.count()} visits before {cutoff.isoformat()} to {archive_dir}, '
+                f'and delete {PageVisitHourly.objects.filter(bucket__lt=hourly_cutoff).count()} hourly rollups'
+            )
+            return
+
+        if oldest is not None:
+            # Raw rows are the only record of these visits until the rollups
+            # include them; recomputing the range also covers history recorded
+            # before the rollups existed
+            counted = rebuild_rollups(since=oldest, until=cutoff)
+            self.stdout.write(f'Rollups checked for {counted} visits before {cutoff.isoformat()}')
+            archived = self.archive(cutoff, options['chunk_size'], archive_dir)
+        else:
+            archived = 0
+
+        deleted, _ = PageVisitHourly.objects.filter(bucket__lt=hourly_cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} visits older than {options["days"]} days; '
+            f'deleted {deleted} hourly rollups older than {options["hourly_days"]} days'
+        ))
@@ -0,0 +1,142 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from api.models import Product, Vertical
+from api.pagination import ProductKeysetPagination
+
+
+# How an index range that starts at a key shows in EXPLAIN (SQLite, PostgreSQL)
+SEEK_PLAN_WORDS = ('SEARCH', 'Index Cond')
+# Queries whose cost must not grow with the cursor's depth
+KEYSET_QUERIES = {'keyset page, rest of group', 'keyset page, next groups'}
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic benchmark rows"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the main Product queries and check their plans use the indexes '
+        'declared on Product (SQLite or PostgreSQL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Insert this many synthetic products first (rolled back afterwards)'
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Executions per query')
+
+    def get_queries(self):
+        """(label, expected index or None for a full read, queryset) per query"""
+        vertical_id = Vertical.objects.values_list('id', flat=True).first()
+        public = Product.objects.filter(is_active=True, is_public=True)
+        count = public.count()
+
+        queries = [
+            ('catalogue page', 'api_product_public_order_idx',
+             public.order_by('order', '-created_at')[:24]),
+            ('featured', 'api_product_featured_idx',
+             public.filter(is_featured=True).order_by('featured_order', 'order', 'name')),
+        ]
+        if count:
+            # The paginator's own ranges, from a cursor near the end of the
+            # catalogue, where a query that scans up to the cursor is slowest
+            deep = public.order_by(*ProductKeysetPagination.ordering)[count * 9 // 10]
+            same_group, later_groups = ProductKeysetPagination().cursor_ranges(
+                public, (deep.order, deep.created_at, deep.pk)
+            )
+            queries += [
+                ('keyset page, rest of group', 'api_product_public_order_idx', same_group[:25]),
+                ('keyset page, next groups', 'api_product_public_order_idx', later_groups[:25]),
+            ]
+        if vertical_id is not None:
+            queries += [
+                ('category page', 'api_product_public_vert_idx',
+                 public.filter(vertical_id=vertical_id).order_by('order', '-created_at')[:24]),
+                ('vertical PDF / chatbot count', 'api_product_vert_active_idx',
+                 Product.objects.filter(vertical_id=vertical_id, is_active=True).order_by('order')),
+            ]
+        # These read every matching row, so a scan is the right plan; they are
+        # timed to show what the whole catalogue costs
+        queries += [
+            ('sitemap', None, Product.objects.filter(is_active=True)),
+            ('chatbot search index build', None, public.select_related('vertical')),
+        ]
+        return queries
+
+    def seed(self, count):
+        vertical = Vertical.objects.first()
+        if vertical is None:
+            vertical = Vertical.objects.create(
+                title='Benchmark', description='Benchmark vertical', icon_name='Box',
+                secondary_icon_name='Box', gradient='', bg_gradient='', image='verticals/benchmark.jpg',
+                button_color='',
+            )
+        # bulk_create skips Product.save() (slug loop and image optimisation)
+        Product.objects.bulk_create([
+            Product(
+                vertical=vertical,
+                name=f'Benchmark product {i}',
+                slug=f'benchmark-product-{i}',
+                description='Synthetic product for index benchmarks',
+                image='products/benchmark.jpg',
+                moq='1 MT',
+                packaging='25 kg bags',
+                order=i % 50,
+                is_public=i % 10 != 0,
+                is_featured=i % 100 == 0,
+                featured_order=i % 7,
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        self.stdout.write(f'Seeded {count} synthetic products')
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE api_product' if connection.vendor == 'postgresql' else 'ANALYZE')
+
+    def run_benchmark(self, repeat):
+        self.stdout.write(f'Database: {connection.vendor}, {Product.objects.count()} products\n')
+        missing = 0
+        for label, index_name, queryset in self.get_queries():
+            plan = queryset.explain()
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset)
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+
+            if index_name is None:
+                self.stdout.write(f"FULL {label:<30} {elapsed:8.2f} ms  reads every matching row")
+            else:
+                uses_index = index_name in plan
+                if label in KEYSET_QUERIES:
+                    # Walking the index from its start also names it in the plan
+                    uses_index = uses_index and any(word in plan for word in SEEK_PLAN_WORDS)
+                missing += not uses_index
+                style = self.style.SUCCESS if uses_index else self.style.WARNING
+                self.stdout.write(style(
+                    f"{'OK  ' if uses_index else 'MISS'} {label:<30} {elapsed:8.2f} ms  expected {index_name}"
+                ))
+            self.stdout.write(f'     {plan.strip().replace(chr(10), chr(10) + "     ")}')
+
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f'{missing} queries did not use the expected index. Small tables are often '
+                f'scanned on purpose; re-run with --seed 50000.'
+            ))
+
+    def handle(self, *args, **options):
+        if not options['seed']:
+            self.run_benchmark(options['repeat'])
+            return
+
+        try:
+            with transaction.atomic():
+                self.seed(options['seed'])
+                self.analyze()
+                self.run_benchmark(options['repeat'])
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Synthetic products rolled back')
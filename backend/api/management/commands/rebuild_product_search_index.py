@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from api.search import ensure_search_index, missing_search_objects
+
+
+class Command(BaseCommand):
+    help = (
+        'Check the SQLite FTS5 product search table and its sync triggers, recreate '
+        'anything missing and re-index every product. Does nothing on PostgreSQL, '
+        'where the search index is an expression index.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report missing objects; exit 1 if any')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(f'Nothing to do on {connection.vendor}')
+            return
+
+        if options['check']:
+            missing = missing_search_objects()
+            if missing:
+                self.stderr.write(self.style.ERROR(f"Missing: {', '.join(missing)}"))
+                raise SystemExit(1)
+            self.stdout.write(self.style.SUCCESS('Product search index is complete'))
+            return
+
+        recreated = ensure_search_index(rebuild=True)
+        if recreated:
+            self.stdout.write(self.style.WARNING(f"Recreated: {', '.join(recreated)}"))
+        self.stdout.write(self.style.SUCCESS('Product search index rebuilt'))
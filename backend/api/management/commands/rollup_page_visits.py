@@ -0,0 +1,35 @@
+from datetime import datetime, time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from django.utils import timezone
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the hourly and daily PageVisit rollups from the raw visits. '
+        'New visits are added to the rollups as they are written; run this once to '
+        'backfill older history, or to repair a range.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day to recompute (YYYY-MM-DD); default: all history')
+        parser.add_argument(
+            '--until',
+            help='Day to stop before (YYYY-MM-DD); default: the start of the current hour, '
+                 'which the ingestion path is still updating'
+        )
+
+    def parse_day(self, value):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid date: {value}')
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def handle(self, *args, **options):
+        since = self.parse_day(options['since'])
+        until = self.parse_day(options['until']) or timezone.now()
+        counted = rebuild_rollups(since=since, until=until)
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {counted} page visits'))
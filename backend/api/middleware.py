@@ -1,7 +1,7 @@
 from django.utils.deprecation import MiddlewareMixin
-from django.utils import timezone
-from .models import PageVisit
+from .visits import parse_visit_event, recent_visits, visit_writes
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -12,40 +12,49 @@ class DisableCSRFMiddleware(MiddlewareMixin):
             setattr(request, '_dont_enforce_csrf_checks', True)
 
 class VisitorTrackingMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        # Only track frontend pages, not API, admin, or static files
-        if (request.path.startswith('/api/') or 
-            request.path.startswith('/admin/') or 
-            request.path.startswith('/static/') or
-            request.path.startswith('/media/')):
-            return None
-        
-        # Ensure session exists
-        if not hasattr(request, 'session') or not request.session.session_key:
-            request.session.save()
-        
-        session_key = request.session.session_key
-        current_time = timezone.now()
-        
-        # Check if this session has visited this page in the last 30 minutes
-        recent_visit = PageVisit.objects.filter(
-            session_id=session_key,
-            page=request.path,
-            timestamp__gte=current_time - timezone.timedelta(minutes=30)
-        ).first()
-        
-        if not recent_visit:
-            # Create new page visit record
-            PageVisit.objects.create(
-                page=request.path,
-                action='page_view',
-                ip_address=self.get_client_ip(request),
-                user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
-                referrer=request.META.get('HTTP_REFERER', ''),
-                session_id=session_key,
-            )
-        
-        return None
+    """
+    Record server-rendered page views.
+
+    No database work happens on the request path: repeat views are filtered
+    by ``recent_visits`` in memory, and new ones are queued on
+    ``visit_writes`` for the next batch insert. Visitors are identified by
+    their session key if they have one, otherwise by a cookie, so no
+    session is created just to be tracked.
+    """
+    cookie_name = 'visitor_id'
+    cookie_max_age = 60 * 60 * 24 * 365
+    excluded_prefixes = ('/api/', '/admin/', '/static/', '/media/')
+
+    def process_response(self, request, response):
+        # Only track successful frontend page loads, not API, admin, or static files
+        if (request.method != 'GET' or
+                response.status_code >= 400 or
+                request.path.startswith(self.excluded_prefixes)):
+            return response
+
+        try:
+            session = getattr(request, 'session', None)
+            visitor_id = (session.session_key if session is not None else None) or request.COOKIES.get(self.cookie_name)
+            if not visitor_id:
+                visitor_id = uuid.uuid4().hex
+                response.set_cookie(
+                    self.cookie_name, visitor_id, max_age=self.cookie_max_age,
+                    httponly=True, samesite='Lax', secure=request.is_secure(),
+                )
+
+            if not recent_visits.seen(visitor_id, request.path):
+                visit = parse_visit_event(
+                    {'page': request.path, 'session_id': visitor_id},
+                    ip_address=self.get_client_ip(request),
+                    user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                    referrer=request.META.get('HTTP_REFERER', ''),
+                )
+                if visit is not None:
+                    visit_writes.add([visit])
+        except Exception:
+            # Tracking must never break the page
+            logger.exception('Failed to record page visit')
+        return response
     
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_companyinfo_email_companyinfo_phone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['order', '-created_at', 'id'], name='api_product_keyset_idx'),
+        ),
+    ]
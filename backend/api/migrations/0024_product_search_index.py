@@ -0,0 +1,71 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:00
+
+from django.db import migrations
+
+# Kept in step with api/search.py (sqlite_search_index_sql)
+FTS_TABLE = 'api_product_fts'
+FTS_COLUMNS = ['name', 'brand', 'certifications', 'features', 'description']
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(brand, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(certifications, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(features, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'D')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS api_product_search_gin ON api_product USING GIN (({PG_SEARCH_VECTOR}))"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS api_product_name_trgm ON api_product USING GIN (name gin_trgm_ops)"
+        )
+    elif vendor == 'sqlite':
+        columns = ', '.join(FTS_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+        old_values = ', '.join(f'old.{column}' for column in FTS_COLUMNS)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{columns}, content='api_product', content_rowid='id', tokenize='porter unicode61')"
+        )
+        # External-content table: triggers keep it in step with api_product
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON api_product BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON api_product BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON api_product BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS api_product_search_gin")
+        schema_editor.execute("DROP INDEX IF EXISTS api_product_name_trgm")
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_product_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
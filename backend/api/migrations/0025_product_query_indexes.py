@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_product_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='api_product_keyset_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_public', True)), fields=['order', '-created_at', 'id'], name='api_product_public_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_public', True)), fields=['vertical', 'order', '-created_at'], name='api_product_public_vert_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_featured', True), ('is_public', True)), fields=['featured_order', 'order', 'name'], name='api_product_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['vertical', 'order'], name='api_product_vert_active_idx'),
+        ),
+    ]
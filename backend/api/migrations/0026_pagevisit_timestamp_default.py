@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_product_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pagevisit',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_pagevisit_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageVisitDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.CharField(max_length=50)),
+                ('action', models.CharField(max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('day', models.DateField()),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.product')),
+            ],
+            options={
+                'verbose_name': 'Daily Visit Rollup',
+                'verbose_name_plural': 'Daily Visit Rollups',
+                'ordering': ['-day'],
+                'indexes': [
+                    models.Index(fields=['day', 'page'], name='api_visitday_day_idx'),
+                    models.Index(fields=['page'], name='api_visitday_page_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='PageVisitHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.CharField(max_length=50)),
+                ('action', models.CharField(max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('bucket', models.DateTimeField(help_text='Start of the hour')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.product')),
+            ],
+            options={
+                'verbose_name': 'Hourly Visit Rollup',
+                'verbose_name_plural': 'Hourly Visit Rollups',
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['bucket', 'page'], name='api_visithour_bucket_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_pagevisit_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Referrer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_hash', models.CharField(editable=False, max_length=64, unique=True)),
+                ('host', models.CharField(db_index=True, max_length=255)),
+                ('path', models.CharField(blank=True, max_length=500)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Referrer',
+                'verbose_name_plural': 'Referrers',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_hash', models.CharField(editable=False, max_length=64, unique=True)),
+                ('user_agent', models.TextField(blank=True)),
+                ('browser', models.CharField(blank=True, max_length=50)),
+                ('os', models.CharField(blank=True, max_length=50)),
+                ('device_type', models.CharField(choices=[('desktop', 'Desktop'), ('mobile', 'Mobile'), ('tablet', 'Tablet'), ('bot', 'Bot'), ('unknown', 'Unknown')], db_index=True, default='unknown', max_length=20)),
+                ('is_bot', models.BooleanField(db_index=True, default=False)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'User Agent',
+                'verbose_name_plural': 'User Agents',
+            },
+        ),
+        # The text columns are kept under new names until 0029 has copied them
+        migrations.RenameField(
+            model_name='pagevisit',
+            old_name='user_agent',
+            new_name='user_agent_text',
+        ),
+        migrations.RenameField(
+            model_name='pagevisit',
+            old_name='referrer',
+            new_name='referrer_url',
+        ),
+        migrations.AddField(
+            model_name='pagevisit',
+            name='user_agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='visits', to='api.useragent'),
+        ),
+        migrations.AddField(
+            model_name='pagevisit',
+            name='referrer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='visits', to='api.referrer'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:00
+
+from django.db import migrations
+
+from api.useragents import classify_user_agent, referrer_fields
+
+BATCH_SIZE = 2000
+
+
+def intern(model, fields_by_hash, known):
+    """Ids for the given dimension rows, creating the missing ones"""
+    missing = [key for key in fields_by_hash if key not in known]
+    if missing:
+        model.objects.bulk_create(
+            [model(**fields_by_hash[key]) for key in missing], ignore_conflicts=True
+        )
+        known.update(model.objects.filter(key_hash__in=missing).values_list('key_hash', 'id'))
+
+
+def fill_dimensions(apps, schema_editor):
+    PageVisit = apps.get_model('api', 'PageVisit')
+    UserAgent = apps.get_model('api', 'UserAgent')
+    Referrer = apps.get_model('api', 'Referrer')
+    user_agents, referrers = {}, {}
+
+    last_id = 0
+    while True:
+        visits = list(
+            PageVisit.objects.filter(id__gt=last_id).order_by('id')
+            .only('id', 'user_agent_text', 'referrer_url')[:BATCH_SIZE]
+        )
+        if not visits:
+            break
+        last_id = visits[-1].id
+
+        agent_fields, referrer_fields_by_hash, keys = {}, {}, {}
+        for visit in visits:
+            agent = classify_user_agent(visit.user_agent_text) if visit.user_agent_text else None
+            referrer = referrer_fields(visit.referrer_url)
+            if agent:
+                agent_fields[agent['key_hash']] = agent
+            if referrer:
+                referrer_fields_by_hash[referrer['key_hash']] = referrer
+            keys[visit.id] = (agent and agent['key_hash'], referrer and referrer['key_hash'])
+
+        intern(UserAgent, agent_fields, user_agents)
+        intern(Referrer, referrer_fields_by_hash, referrers)
+        for visit in visits:
+            agent_hash, referrer_hash = keys[visit.id]
+            visit.user_agent_id = user_agents.get(agent_hash)
+            visit.referrer_id = referrers.get(referrer_hash)
+        PageVisit.objects.bulk_update(visits, ['user_agent', 'referrer'])
+
+
+def restore_text(apps, schema_editor):
+    PageVisit = apps.get_model('api', 'PageVisit')
+    last_id = 0
+    while True:
+        visits = list(
+            PageVisit.objects.filter(id__gt=last_id).order_by('id')
+            .select_related('user_agent', 'referrer')[:BATCH_SIZE]
+        )
+        if not visits:
+            break
+        last_id = visits[-1].id
+        for visit in visits:
+            visit.user_agent_text = visit.user_agent.user_agent if visit.user_agent else ''
+            visit.referrer_url = (
+                f"https://{visit.referrer.host}{visit.referrer.path}" if visit.referrer else None
+            )
+        PageVisit.objects.bulk_update(visits, ['user_agent_text', 'referrer_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_visit_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_dimensions, restore_text),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_backfill_visit_dimensions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='pagevisit',
+            name='user_agent_text',
+        ),
+        migrations.RemoveField(
+            model_name='pagevisit',
+            name='referrer_url',
+        ),
+    ]
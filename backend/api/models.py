@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
 from django.utils import timezone
 from PIL import Image
 import os
@@ -218,20 +219,75 @@ class Product(models.Model):
     
     class Meta:
         ordering = ['order', '-created_at']
+        # Designed from the real queries: ProductViewSet (list, category,
+        # featured, keyset pages), pdf_generator and the chatbot's per-vertical
+        # counts. Check the plans with `manage.py benchmark_product_queries`.
+        indexes = [
+            # Public catalogue in display order, also used by keyset pagination
+            models.Index(
+                fields=['order', '-created_at', 'id'], name='api_product_public_order_idx',
+                condition=Q(is_active=True, is_public=True),
+            ),
+            # ?category= on the public catalogue
+            models.Index(
+                fields=['vertical', 'order', '-created_at'], name='api_product_public_vert_idx',
+                condition=Q(is_active=True, is_public=True),
+            ),
+            # ?featured=true, ordered by featured_order
+            models.Index(
+                fields=['featured_order', 'order', 'name'], name='api_product_featured_idx',
+                condition=Q(is_active=True, is_public=True, is_featured=True),
+            ),
+            # Active products per vertical, including catalogue-only ones (PDF, chatbot counts)
+            models.Index(
+                fields=['vertical', 'order'], name='api_product_vert_active_idx',
+                condition=Q(is_active=True),
+            ),
+        ]
+    
+    def allocate_slug(self):
+        """
+        Return the first free slug for this product's name (name, name-1, name-2, ...).
+        
+        All taken slugs sharing the base are fetched in one query, so bulk
+        imports of similarly named products don't issue a query per collision.
+        """
+        from django.utils.text import slugify
+        max_length = self._meta.get_field('slug').max_length
+        base_slug = (slugify(self.name) or 'product')[:max_length - 10].strip('-')
+        
+        taken = set(
+            Product.objects.filter(slug__startswith=base_slug)
+            .exclude(pk=self.pk)
+            .values_list('slug', flat=True)
+        )
+        if base_slug not in taken:
+            return base_slug
+        counter = 1
+        while f"{base_slug}-{counter}" in taken:
+            counter += 1
+        return f"{base_slug}-{counter}"
     
     def save(self, *args, **kwargs):
         # Generate slug
-        if not self.slug:
-            from django.utils.text import slugify
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-            while Product.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
+        generated_slug = not self.slug
+        if generated_slug:
+            self.slug = self.allocate_slug()
         
-        super().save(*args, **kwargs)
+        # A concurrent save can take the same slug between allocation and
+        # insert; the unique constraint catches it and we allocate again
+        for attempt in range(5):
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                break
+            except IntegrityError:
+                if not generated_slug or attempt == 4:
+                    raise
+                # Some other constraint failed; don't mask it as a slug clash
+                if not Product.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
+                    raise
+                self.slug = self.allocate_slug()
         
         # Optimize all product images
         for image_field in [self.image, self.image_2, self.image_3]:
@@ -295,6 +351,49 @@ class QuoteRequest(models.Model):
         return f"Quote Request - {self.name}"
 
 
+class UserAgent(models.Model):
+    """A distinct User-Agent header, parsed once; PageVisit rows point here"""
+    DEVICE_CHOICES = [
+        ('desktop', 'Desktop'),
+        ('mobile', 'Mobile'),
+        ('tablet', 'Tablet'),
+        ('bot', 'Bot'),
+        ('unknown', 'Unknown'),
+    ]
+
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    user_agent = models.TextField(blank=True)
+    browser = models.CharField(max_length=50, blank=True)
+    os = models.CharField(max_length=50, blank=True)
+    device_type = models.CharField(max_length=20, choices=DEVICE_CHOICES, default='unknown', db_index=True)
+    is_bot = models.BooleanField(default=False, db_index=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'User Agent'
+        verbose_name_plural = 'User Agents'
+
+    def __str__(self):
+        if self.browser or self.os:
+            return f"{self.browser or 'Unknown browser'} on {self.os or 'unknown OS'} ({self.device_type})"
+        return self.user_agent[:80] or '(empty)'
+
+
+class Referrer(models.Model):
+    """A distinct referring host and path (query strings are not kept)"""
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    host = models.CharField(max_length=255, db_index=True)
+    path = models.CharField(max_length=500, blank=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Referrer'
+        verbose_name_plural = 'Referrers'
+
+    def __str__(self):
+        return f"{self.host}{self.path}"
+
+
 class PageVisit(models.Model):
     PAGE_CHOICES = [
         ('home', 'Home Page'),
@@ -314,9 +413,10 @@ class PageVisit(models.Model):
     page = models.CharField(max_length=50, choices=PAGE_CHOICES)
     action = models.CharField(max_length=50, choices=ACTION_CHOICES, default='page_view')
     ip_address = models.GenericIPAddressField(blank=True, null=True)
-    user_agent = models.TextField(blank=True)
-    referrer = models.URLField(blank=True, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    user_agent = models.ForeignKey(UserAgent, on_delete=models.SET_NULL, null=True, blank=True, related_name='visits')
+    referrer = models.ForeignKey(Referrer, on_delete=models.SET_NULL, null=True, blank=True, related_name='visits')
+    # Set when the event is received, not when the batch is written
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     session_id = models.CharField(max_length=100, blank=True)
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
 
@@ -333,6 +433,54 @@ class PageVisit(models.Model):
     def __str__(self):
         return f"{self.page} - {self.action} @ {self.timestamp.isoformat()}"
 
+
+class PageVisitRollup(models.Model):
+    """
+    Visit counts per page, action and product for one time bucket.
+
+    Maintained by api/rollups.py as visits are written, so the dashboard
+    never scans PageVisit. A key may occasionally have more than one row
+    (two workers creating it at once); always read counts with Sum().
+    """
+    page = models.CharField(max_length=50)
+    action = models.CharField(max_length=50)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class PageVisitHourly(PageVisitRollup):
+    bucket = models.DateTimeField(help_text="Start of the hour")
+
+    class Meta:
+        verbose_name = 'Hourly Visit Rollup'
+        verbose_name_plural = 'Hourly Visit Rollups'
+        ordering = ['-bucket']
+        indexes = [
+            models.Index(fields=['bucket', 'page'], name='api_visithour_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.page} - {self.action} @ {self.bucket.isoformat()}: {self.count}"
+
+
+class PageVisitDaily(PageVisitRollup):
+    day = models.DateField()
+
+    class Meta:
+        verbose_name = 'Daily Visit Rollup'
+        verbose_name_plural = 'Daily Visit Rollups'
+        ordering = ['-day']
+        indexes = [
+            models.Index(fields=['day', 'page'], name='api_visitday_day_idx'),
+            models.Index(fields=['page'], name='api_visitday_page_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.page} - {self.action} @ {self.day.isoformat()}: {self.count}"
+
 class HeroSlide(models.Model):
     """Hero carousel slides - separate from categories"""
     title = models.CharField(max_length=200, help_text="Slide title/headline")
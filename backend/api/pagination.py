@@ -0,0 +1,110 @@
+"""
+Keyset (cursor) pagination for the product catalogue.
+
+Pages start at the cursor's position in the catalogue ordering instead of
+using ``OFFSET``: one index range for the rest of the cursor's ``order``
+group and, when that runs out, a second one for the following groups. A
+page costs the same at any depth and no ``COUNT(*)`` is needed. Clients
+opt in with ``?pagination=cursor`` and follow the ``next`` link.
+"""
+import base64
+import json
+from collections import OrderedDict
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ProductKeysetPagination(BasePagination):
+    """Forward-only keyset pagination ordered by (order, -created_at, id)"""
+
+    ordering = ('order', '-created_at', 'id')
+    cursor_query_param = 'cursor'
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, product):
+        position = [product.order, product.created_at.isoformat(), product.pk]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def cursor_ranges(self, queryset, cursor):
+        """
+        The rows after ``cursor`` ((order, created_at, pk)), in catalogue
+        order, as two index ranges: the rest of the cursor's ``order`` group
+        and the groups after it. A single OR over the three columns can't
+        seek the index, so it would scan every row before the cursor.
+        """
+        order, created_at, pk = cursor
+        queryset = queryset.order_by(*self.ordering)
+        return (
+            queryset.filter(order=order, created_at__lte=created_at)
+            .filter(Q(created_at__lt=created_at) | Q(pk__gt=pk)),
+            queryset.filter(order__gt=order),
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            order, created_at, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return int(order), created_at, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+
+        # One extra row tells us whether there is a next page
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            rows = list(queryset.order_by(*self.ordering)[:size + 1])
+        else:
+            same_group, later_groups = self.cursor_ranges(queryset, cursor)
+            rows = list(same_group[:size + 1])
+            if len(rows) <= size:
+                rows += later_groups[:size + 1 - len(rows)]
+        self.next_product = rows[size - 1] if len(rows) > size else None
+        return rows[:size]
+
+    def get_next_link(self):
+        if self.next_product is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_product))
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('first', self.get_first_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,135 @@
+"""
+HTTP caching for the read-only API endpoints.
+
+ConditionalGetMixin sends strong ETags and Last-Modified headers computed
+from one aggregate query (row count and max ``updated_at``) plus the
+catalogue and site content versions, and answers matching conditional
+requests with 304 before anything is serialized. Deleting a row doesn't
+advance max ``updated_at``, so Last-Modified also includes the time of the
+last version bump (signals.py bumps on deletes too).
+
+CachedJSONResponseMixin stores the final JSON bytes of GET responses, with
+their validators, under a key that includes the same versions, so a hit
+skips the ORM and DRF serialization entirely, and any admin change (which
+bumps a version through signals.py) makes the old entries unreachable.
+With a per-process cache (no REDIS_URL) the bump only reaches one worker,
+so entries then live at most LOCAL_CACHE_MAX_TIMEOUT seconds.
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, QuerySet
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from .catalogue import (
+    get_catalogue_changed_at, get_catalogue_version, get_site_content_changed_at,
+    get_site_content_version, versioned_cache_timeout,
+)
+
+
+def set_validators(response, etag, last_modified):
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified support for list and detail actions"""
+
+    def _has_updated_at(self, model):
+        return any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+
+    def get_validators(self, request, queryset):
+        """Return (etag, last_modified timestamp) for ``queryset``, without serializing it"""
+        if not isinstance(queryset, QuerySet):
+            return None, None
+
+        aggregates = {'row_count': Count('pk')}
+        if self._has_updated_at(queryset.model):
+            aggregates['last_updated'] = Max('updated_at')
+        stats = queryset.order_by().aggregate(**aggregates)
+        last_updated = stats.get('last_updated')
+
+        # Versions cover related rows (e.g. a vertical title shown on a product)
+        parts = [
+            self.__class__.__name__,
+            request.get_full_path(),
+            getattr(request.accepted_renderer, 'format', ''),
+            stats['row_count'],
+            last_updated.isoformat() if last_updated else '',
+            get_catalogue_version(),
+            get_site_content_version(),
+        ]
+        etag = quote_etag(hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest())
+        last_modified = max(get_catalogue_changed_at(), get_site_content_changed_at())
+        if last_updated:
+            last_modified = max(last_modified, int(last_updated.timestamp()))
+        return etag, last_modified
+
+    def _conditional(self, request, queryset, handler, *args, **kwargs):
+        etag, last_modified = self.get_validators(request, queryset)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return set_validators(not_modified, etag, last_modified)
+        return set_validators(handler(request, *args, **kwargs), etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self._conditional(request, queryset, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if isinstance(queryset, QuerySet):
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return self._conditional(request, queryset, super().retrieve, *args, **kwargs)
+
+
+class CachedJSONResponseMixin(ConditionalGetMixin):
+    """Serve GET requests on a viewset from cached, pre-rendered JSON"""
+
+    def _wants_json(self, request):
+        # The browsable API (HTML) is rendered per request and never cached
+        return (
+            request.GET.get('format', 'json') == 'json'
+            and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+        )
+
+    def get_response_cache_key(self, request):
+        # Absolute URI: media URLs in the payload include the host
+        uri_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return (
+            f"api_response_{self.__class__.__name__}_"
+            f"{get_catalogue_version()}_{get_site_content_version()}_{uri_hash}"
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or not self._wants_json(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        cache_key = self.get_response_cache_key(request)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            etag, last_modified = cached['etag'], cached['last_modified']
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return set_validators(not_modified, etag, last_modified)
+            response = HttpResponse(cached['content'], content_type='application/json')
+            response['Vary'] = 'Accept'
+            return set_validators(response, etag, last_modified)
+
+        response = super().dispatch(request, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if response.status_code == 200 and renderer is not None and renderer.format == 'json':
+            response.render()
+            last_modified = response.get('Last-Modified')
+            cache.set(cache_key, {
+                'content': response.content,
+                'etag': response.get('ETag'),
+                'last_modified': parse_http_date_safe(last_modified) if last_modified else None,
+            }, versioned_cache_timeout(getattr(settings, 'API_RESPONSE_CACHE_TIMEOUT', 60 * 60 * 24)))
+        return response
+
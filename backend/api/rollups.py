@@ -0,0 +1,149 @@
+"""
+Hourly and daily PageVisit rollups for the admin dashboard.
+
+``record_visits`` is called by the visit writer (api/visits.py) in the same
+transaction that inserts the raw rows, and adds each batch's counts to the
+rollup tables: one SELECT per table to find the existing rows, then one
+``bulk_update`` with ``F()`` increments and one ``bulk_create``.
+
+``rebuild_rollups`` recomputes the tables from the raw PageVisit rows with
+GROUP BY queries, one day per transaction; the ``rollup_page_visits``
+command uses it to backfill history recorded before the rollups existed.
+It never touches periods older than the oldest raw visit, whose counts
+survive only in the rollups once archive_page_visits has run.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from typing import Iterable
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from .models import PageVisit, PageVisitDaily, PageVisitHourly
+
+KEY_FIELDS = ('page', 'action', 'product_id')
+
+
+def hour_bucket(timestamp):
+    return timezone.localtime(timestamp).replace(minute=0, second=0, microsecond=0)
+
+
+def _increment(model, bucket_field: str, counts: Counter):
+    """Add ``counts`` ({(bucket, page, action, product_id): n}) to ``model``"""
+    buckets = {key[0] for key in counts}
+    existing = {}
+    for row in model.objects.filter(**{f'{bucket_field}__in': buckets}).only(bucket_field, *KEY_FIELDS):
+        key = (getattr(row, bucket_field), row.page, row.action, row.product_id)
+        existing.setdefault(key, row)
+
+    updated, created = [], []
+    for key, count in counts.items():
+        row = existing.get(key)
+        if row is not None:
+            row.count = F('count') + count
+            updated.append(row)
+        else:
+            bucket, page, action, product_id = key
+            created.append(model(**{bucket_field: bucket}, page=page, action=action,
+                                 product_id=product_id, count=count))
+    if updated:
+        model.objects.bulk_update(updated, ['count'])
+    if created:
+        model.objects.bulk_create(created)
+
+
+def record_visits(visits: Iterable[PageVisit]):
+    """Add a batch of newly written visits to the hourly and daily rollups"""
+    hourly, daily = Counter(), Counter()
+    for visit in visits:
+        bucket = hour_bucket(visit.timestamp)
+        key = (visit.page, visit.action, visit.product_id)
+        hourly[(bucket, *key)] += 1
+        daily[(bucket.date(), *key)] += 1
+    if not hourly:
+        return
+    with transaction.atomic():
+        _increment(PageVisitHourly, 'bucket', hourly)
+        _increment(PageVisitDaily, 'day', daily)
+
+
+def _rebuild_window(start, end) -> int:
+    """Recompute hourly rows in [start, end) and the daily rows of that day, in one transaction"""
+    day_start = timezone.make_aware(datetime.combine(start.date(), time.min))
+    day_end = day_start + timedelta(days=1)
+    with transaction.atomic():
+        PageVisitHourly.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+        rows = list(
+            PageVisit.objects.order_by()
+            .filter(timestamp__gte=start, timestamp__lt=end)
+            .annotate(hour=TruncHour('timestamp'))
+            .values('hour', *KEY_FIELDS)
+            .annotate(visits=Count('id'))
+        )
+        PageVisitHourly.objects.bulk_create([
+            PageVisitHourly(bucket=row['hour'], page=row['page'], action=row['action'],
+                            product_id=row['product_id'], count=row['visits'])
+            for row in rows
+        ], batch_size=1000)
+
+        # The day is re-derived from all of its hourly rows, including hours
+        # outside the window
+        day_rows = list(
+            PageVisitHourly.objects.order_by()
+            .filter(bucket__gte=day_start, bucket__lt=day_end)
+            .values(*KEY_FIELDS)
+            .annotate(visits=Sum('count'))
+        )
+        PageVisitDaily.objects.filter(day=start.date()).delete()
+        PageVisitDaily.objects.bulk_create([
+            PageVisitDaily(day=start.date(), page=row['page'], action=row['action'],
+                           product_id=row['product_id'], count=row['visits'])
+            for row in day_rows
+        ], batch_size=1000)
+    return sum(row['visits'] for row in rows)
+
+
+def rebuild_rollups(since=None, until=None) -> int:
+    """
+    Recompute the rollups for raw visits in [since, until) (everything by
+    default) and return the number of visits counted. ``since`` and
+    ``until`` are rounded down to the hour.
+
+    ``since`` is clamped to the oldest raw visit: once archive_page_visits
+    has deleted old visits, the rollups are their only record. Each day is
+    committed separately, so the database isn't locked for the whole range.
+    """
+    visits = PageVisit.objects.order_by('timestamp').values_list('timestamp', flat=True)
+    oldest, newest = visits.first(), visits.last()
+    if oldest is None:
+        return 0
+    since = max(hour_bucket(since), hour_bucket(oldest)) if since is not None else hour_bucket(oldest)
+    until = hour_bucket(until) if until is not None else hour_bucket(newest) + timedelta(hours=1)
+
+    counted = 0
+    start = since
+    while start < until:
+        next_day = timezone.make_aware(datetime.combine(start.date() + timedelta(days=1), time.min))
+        end = min(next_day, until)
+        counted += _rebuild_window(start, end)
+        start = end
+    return counted
+
+
+def visit_totals() -> dict:
+    """Dashboard figures, read from the rollup tables only"""
+    now = timezone.now()
+    today = timezone.localdate(now)
+    daily = PageVisitDaily.objects.order_by()
+    return {
+        'total_visits': daily.aggregate(total=Sum('count'))['total'] or 0,
+        'unique_pages': daily.values('page').distinct().count(),
+        'today_visits': daily.filter(day=today).aggregate(total=Sum('count'))['total'] or 0,
+        'last_24h_visits': (
+            PageVisitHourly.objects.filter(bucket__gt=hour_bucket(now) - timedelta(hours=24))
+            .aggregate(total=Sum('count'))['total'] or 0
+        ),
+        'popular_pages': list(
+            daily.values('page').annotate(visit_count=Sum('count')).order_by('-visit_count')[:10]
+        ),
+    }
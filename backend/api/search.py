@@ -0,0 +1,250 @@
+"""
+Server-side product search with relevance ranking.
+
+PostgreSQL: a weighted tsvector over name, brand, certifications, features
+and description, served by an expression GIN index, ranked with ts_rank.
+SQLite (dev): an external-content FTS5 table kept in sync by triggers, ranked
+with bm25. Both indexes are created by migration 0024.
+
+When full-text search finds fewer results than asked for, names are matched
+by trigram similarity so misspellings ("basmatti", "tumric") still hit:
+pg_trgm on PostgreSQL, an in-Python trigram comparison on SQLite over a
+short list of the names sharing the most trigrams with the query.
+
+SQLite drops triggers together with their table, and Django remakes the
+table for most Product field changes (AlterField, RemoveField, ...), which
+would leave the FTS table silently stale. ``ensure_search_index`` recreates
+missing triggers and re-indexes; it runs after every ``migrate`` (see
+signals.py) and from the ``rebuild_product_search_index`` command.
+"""
+import logging
+import operator
+import re
+from functools import reduce
+from typing import List, Set
+from django.db import DatabaseError, connection, connections
+from django.db.models import Case, Value, When
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'api_product_fts'
+FTS_COLUMNS = ['name', 'brand', 'certifications', 'features', 'description']
+TRIGRAM_THRESHOLD = 0.3
+# Most product names scored in Python per query on SQLite
+TRIGRAM_CANDIDATES = 500
+# Most query trigrams used to shortlist names
+TRIGRAM_CANDIDATE_GRAMS = 24
+
+FTS_TRIGGERS = [f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au']
+
+# Must match the index expression in migration 0024 exactly, or PostgreSQL
+# won't use the index
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(brand, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(certifications, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(features, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'D')"
+)
+
+# bm25 column weights, in FTS_COLUMNS order
+FTS5_WEIGHTS = '10.0, 5.0, 5.0, 2.0, 1.0'
+
+
+def _terms(query: str) -> List[str]:
+    return re.findall(r'\w+', query.lower())
+
+
+def _trigrams(text: str) -> Set[str]:
+    # Padded like pg_trgm, so short words still produce trigrams
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _postgres_fulltext(query: str, limit: int) -> List[int]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT id FROM api_product
+            WHERE is_active AND is_public
+              AND ({PG_SEARCH_VECTOR}) @@ websearch_to_tsquery('english', %s)
+            ORDER BY ts_rank({PG_SEARCH_VECTOR}, websearch_to_tsquery('english', %s)) DESC, id
+            LIMIT %s
+            """,
+            [query, query, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgres_trigram(query: str, limit: int) -> List[int]:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT set_limit(%s)", [TRIGRAM_THRESHOLD])
+        cursor.execute(
+            """
+            SELECT id FROM api_product
+            WHERE is_active AND is_public AND name %% %s
+            ORDER BY similarity(name, %s) DESC, id
+            LIMIT %s
+            """,
+            [query, query, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _sqlite_fulltext(query: str, limit: int) -> List[int]:
+    terms = _terms(query)
+    if not terms:
+        return []
+    # Quote every term so user input can't inject FTS5 syntax; the last one is
+    # a prefix match for search-as-you-type
+    match = ' '.join(f'"{term}"' for term in terms[:-1])
+    match = f'{match} "{terms[-1]}"*'.strip()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT p.id FROM {FTS_TABLE} f
+            JOIN api_product p ON p.id = f.rowid
+            WHERE {FTS_TABLE} MATCH %s AND p.is_active AND p.is_public
+            ORDER BY bm25({FTS_TABLE}, {FTS5_WEIGHTS}), p.id
+            LIMIT %s
+            """,
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b)
+
+
+def _trigram_candidates(query: str):
+    """
+    Public (id, name) pairs sharing at least one whole trigram with the
+    query, the names sharing the most first, so the best typo matches are
+    inside the TRIGRAM_CANDIDATES cut even when a common trigram matches
+    many more names.
+    """
+    grams = sorted({gram for term in _terms(query) for gram in _trigrams(term) if ' ' not in gram})
+    if not grams:
+        return []
+    shared = reduce(operator.add, [
+        Case(When(name__icontains=gram, then=Value(1)), default=Value(0))
+        for gram in grams[:TRIGRAM_CANDIDATE_GRAMS]
+    ])
+    return (
+        Product.objects.filter(is_active=True, is_public=True)
+        .annotate(shared_grams=shared)
+        .filter(shared_grams__gt=0)
+        .order_by('-shared_grams', 'id')
+        .values_list('id', 'name')[:TRIGRAM_CANDIDATES]
+    )
+
+
+def _python_trigram(query: str, limit: int) -> List[int]:
+    # Score each query word against its closest word in the name, then average
+    wanted = [_trigrams(term) for term in _terms(query)]
+    if not wanted:
+        return []
+    scored = []
+    for pk, name in _trigram_candidates(query):
+        words = [_trigrams(word) for word in _terms(name)]
+        if not words:
+            continue
+        score = sum(max(_similarity(term, word) for word in words) for term in wanted) / len(wanted)
+        if score >= TRIGRAM_THRESHOLD:
+            scored.append((-score, pk))
+    scored.sort()
+    return [pk for _, pk in scored[:limit]]
+
+
+def _fallback(query: str, limit: int) -> List[int]:
+    queryset = Product.objects.filter(is_active=True, is_public=True)
+    for term in _terms(query):
+        queryset = queryset.filter(name__icontains=term)
+    return list(queryset.values_list('id', flat=True)[:limit])
+
+
+def search_product_ids(query: str, limit: int = 20) -> List[int]:
+    """Ids of public products matching ``query``, most relevant first"""
+    query = query.strip()
+    if not query:
+        return []
+
+    vendor = connection.vendor
+    try:
+        if vendor == 'postgresql':
+            ids = _postgres_fulltext(query, limit)
+            if len(ids) < limit:
+                ids += [pk for pk in _postgres_trigram(query, limit) if pk not in ids]
+        elif vendor == 'sqlite':
+            ids = _sqlite_fulltext(query, limit)
+            if len(ids) < limit:
+                ids += [pk for pk in _python_trigram(query, limit) if pk not in ids]
+        else:
+            ids = _fallback(query, limit)
+    except DatabaseError as e:
+        # Search index missing (e.g. SQLite built without FTS5)
+        logger.error(f"Product search index unavailable, falling back to LIKE: {e}")
+        ids = _fallback(query, limit)
+    return ids[:limit]
+
+
+def search_products(query: str, limit: int = 20) -> List[Product]:
+    """Public products matching ``query``, most relevant first"""
+    ids = search_product_ids(query, limit)
+    products = Product.objects.select_related('vertical').in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def sqlite_search_index_sql() -> List[str]:
+    """Statements creating the SQLite FTS5 table and its sync triggers (kept in step with migration 0024)"""
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in FTS_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{columns}, content='api_product', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON api_product BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON api_product BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON api_product BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def missing_search_objects(using=None) -> List[str]:
+    """Names of the SQLite FTS table or triggers that don't exist (always [] elsewhere)"""
+    conn = connection if using is None else connections[using]
+    if conn.vendor != 'sqlite':
+        return []
+    expected = [FTS_TABLE] + FTS_TRIGGERS
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(expected))})",
+            expected
+        )
+        found = {row[0] for row in cursor.fetchall()}
+    return [name for name in expected if name not in found]
+
+
+def ensure_search_index(using=None, rebuild: bool = False) -> List[str]:
+    """
+    Recreate missing SQLite FTS objects and re-index the products if any were
+    missing (or ``rebuild`` is set). Returns the names that were recreated.
+    """
+    conn = connection if using is None else connections[using]
+    if conn.vendor != 'sqlite':
+        return []
+    missing = missing_search_objects(using)
+    if missing or rebuild:
+        with conn.cursor() as cursor:
+            for statement in sqlite_search_index_sql():
+                cursor.execute(statement)
+            # Rows changed while the triggers were gone are only picked up by a full rebuild
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        if missing:
+            logger.warning(f"Recreated missing product search objects: {', '.join(missing)}")
+    return missing
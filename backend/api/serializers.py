@@ -17,7 +17,31 @@ class VerticalSerializer(serializers.ModelSerializer):
             'products'
         ]
 
-class ProductSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """
+    Let list requests (list, search, ...) pick fields with ?fields=a,b or drop
+    them with ?omit=a,b.
+    Detail responses always use the full representation.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        view = self.context.get('view')
+        if request is None or getattr(view, 'detail', True):
+            return
+        
+        fields = request.query_params.get('fields')
+        if fields:
+            keep = {name.strip() for name in fields.split(',')}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+        
+        omit = request.query_params.get('omit')
+        if omit:
+            for name in omit.split(','):
+                self.fields.pop(name.strip(), None)
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     vertical_title = serializers.CharField(source='vertical.title', read_only=True)
     
     class Meta:
@@ -28,6 +52,17 @@ class ProductSerializer(serializers.ModelSerializer):
             'stock_status', 'origin', 'shelf_life', 'storage', 'certifications',
             'features', 'brand', 'is_featured', 'order'
         ]
+
+class ProductCardSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Compact product representation for catalogue grids (?view=card)"""
+    vertical_title = serializers.CharField(source='vertical.title', read_only=True)
+    
+    # Model fields to load for a card, see ProductViewSet.get_queryset
+    load_fields = ['id', 'name', 'slug', 'image', 'badge', 'stock_status', 'order', 'created_at', 'vertical', 'vertical__title']
+    
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'slug', 'vertical', 'vertical_title', 'image', 'badge', 'stock_status']
     
 class ContactInquirySerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,9 +1,15 @@
 """
 Auto-trigger pre-rendering when products are added/updated via Django admin
 """
-from django.db.models.signals import post_save, post_delete
+from django.db import DatabaseError, connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_save, post_delete, post_migrate
 from django.dispatch import receiver
-from .models import Product
+from .models import (
+    Product, Vertical, VerticalProduct, Feature, CompanyInfo, HeroSlide, Certification,
+    PageBackground, SectionBackground, ProductCategory, ProductSubcategory, Brochure
+)
+from .catalogue import bump_catalogue_version, bump_site_content_version
 import subprocess
 import logging
 
@@ -21,6 +27,8 @@ def product_saved(sender, instance, created, **kwargs):
         logger.info(f"Product updated: {instance.name} (slug: {instance.slug})")
         action = "updated"
     
+    bump_catalogue_version()
+    
     # Trigger pre-rendering in background
     try:
         # Run npm run prerender in background
@@ -40,6 +48,7 @@ def product_deleted(sender, instance, **kwargs):
     Trigger pre-rendering when a product is deleted
     """
     logger.info(f"Product deleted: {instance.name}")
+    bump_catalogue_version()
     
     # Trigger pre-rendering to update sitemap
     try:
@@ -52,3 +61,49 @@ def product_deleted(sender, instance, **kwargs):
         logger.info(f"✅ Pre-rendering triggered after product deletion")
     except Exception as e:
         logger.error(f"❌ Failed to trigger pre-rendering: {e}")
+
+@receiver(post_save, sender=Vertical)
+@receiver(post_delete, sender=Vertical)
+def vertical_changed(sender, instance, **kwargs):
+    """
+    Vertical titles and counts are part of the catalogue, so invalidate caches built on it
+    """
+    bump_catalogue_version()
+
+
+SITE_CONTENT_MODELS = [
+    VerticalProduct, Feature, CompanyInfo, HeroSlide, Certification,
+    PageBackground, SectionBackground, ProductCategory, ProductSubcategory, Brochure,
+]
+
+
+def site_content_changed(sender, instance, **kwargs):
+    """
+    Invalidate cached API responses built from the site content
+    """
+    bump_site_content_version()
+
+
+for model in SITE_CONTENT_MODELS:
+    post_save.connect(site_content_changed, sender=model, dispatch_uid=f'site_content_saved_{model.__name__}')
+    post_delete.connect(site_content_changed, sender=model, dispatch_uid=f'site_content_deleted_{model.__name__}')
+
+
+@receiver(post_migrate, dispatch_uid='repair_product_search_index')
+def repair_product_search_index(sender, app_config, using, **kwargs):
+    """
+    Recreate the SQLite search triggers if a migration remade api_product.
+
+    SQLite drops triggers with their table, and Django remakes the table for
+    most Product field changes, which would leave search silently stale.
+    """
+    if app_config.label != 'api':
+        return
+    from .search import ensure_search_index
+    applied = MigrationRecorder(connections[using]).applied_migrations()
+    if ('api', '0024_product_search_index') not in applied:
+        return
+    try:
+        ensure_search_index(using)
+    except DatabaseError as e:
+        logger.error(f"Could not repair the product search index: {e}")
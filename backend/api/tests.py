@@ -1,3 +1,445 @@
-from django.test import TestCase
+import csv
+import gzip
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+
+from .models import PageVisit, PageVisitDaily, PageVisitHourly, Product, Referrer, UserAgent, Vertical
+from .rollups import rebuild_rollups, visit_totals
+from .search import (
+    TRIGRAM_CANDIDATES, ensure_search_index, missing_search_objects, search_product_ids, search_products,
+)
+from .facets import get_facet_rows
+from .middleware import VisitorTrackingMiddleware
+from .pagination import ProductKeysetPagination
+from .visits import RecentVisits, VisitWriteBuffer, referrers, user_agents
+
+
+class ProductQueryCountTests(TestCase):
+    """The catalogue endpoints must not issue a query per product"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vertical = Vertical.objects.create(
+            title='Rice',
+            description='Basmati and non-basmati rice',
+            icon_name='Wheat',
+            secondary_icon_name='Leaf',
+            gradient='from-amber-500 to-orange-600',
+            bg_gradient='from-amber-50 to-orange-50',
+            image='verticals/rice.jpg',
+            button_color='bg-amber-600',
+        )
+        other = Vertical.objects.create(
+            title='Spices',
+            description='Whole and ground spices',
+            icon_name='Leaf',
+            secondary_icon_name='Package',
+            gradient='from-red-500 to-orange-600',
+            bg_gradient='from-red-50 to-orange-50',
+            image='verticals/spices.jpg',
+            button_color='bg-red-600',
+        )
+        # bulk_create skips Product.save(), which would try to optimise the image files
+        Product.objects.bulk_create([
+            Product(
+                vertical=cls.vertical if i % 2 else other,
+                name=f'Product {i}',
+                slug=f'product-{i}',
+                description='Test product',
+                image='products/test.jpg',
+                moq='1 MT',
+                packaging='25 kg bags',
+            )
+            for i in range(20)
+        ])
+
+    def test_product_list_query_count_is_constant(self):
+        # ETag aggregate, COUNT for pagination and one SELECT joining the vertical
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 20)
+        self.assertTrue(all(item['vertical_title'] for item in response.json()['results']))
+
+    def test_product_list_query_count_with_category_filter(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/products/', {'category': self.vertical.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_product_detail_query_count(self):
+        # ETag aggregate and the object lookup
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/product-1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['vertical_title'], 'Rice')
+
+
+    def test_product_list_conditional_get(self):
+        first = self.client.get('/api/products/')
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header('ETag'))
+        self.assertTrue(first.has_header('Last-Modified'))
+
+        # Only the aggregate runs when the client already has the payload
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/api/products/', {'category': self.vertical.id}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_list_last_modified_follows_deletes(self):
+        first = self.client.get('/api/products/')
+        # Deleting doesn't move max(updated_at); the catalogue version bump
+        # records when it happened (a few seconds later, past the
+        # header's one-second resolution)
+        deleted_at = time.time() + 5
+        with mock.patch('api.catalogue.time.time', return_value=deleted_at):
+            Product.objects.get(slug='product-3').delete()
+
+        response = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date(int(deleted_at)))
+
+        response = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_cursor_pagination_walks_catalogue(self):
+        seen = []
+        url = '/api/products/?pagination=cursor&page_size=7'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            # ETag aggregate and one range per ``order`` group the page reads, no OFFSET
+            self.assertLessEqual(len(queries), 3)
+            self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['slug'] for item in response.json()['results'])
+            url = response.json()['next']
+
+        expected = list(
+            Product.objects.order_by('order', '-created_at', 'id').values_list('slug', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_product_cursor_pagination_crosses_order_groups(self):
+        for product in Product.objects.all():
+            Product.objects.filter(pk=product.pk).update(order=product.pk % 3)
+        seen = []
+        url = '/api/products/?pagination=cursor&page_size=4'
+        while url:
+            response = self.client.get(url)
+            seen.extend(item['slug'] for item in response.json()['results'])
+            url = response.json()['next']
+
+        expected = list(
+            Product.objects.order_by('order', '-created_at', 'id').values_list('slug', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_product_cursor_page_seeks_the_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite query plan')
+        products = list(Product.objects.order_by('order', '-created_at', 'id'))
+        cursor = ProductKeysetPagination().encode_cursor(products[15])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', {'pagination': 'cursor', 'cursor': cursor})
+        self.assertEqual([item['slug'] for item in response.json()['results']],
+                         [product.slug for product in products[16:]])
+
+        # Both ranges start at the cursor instead of scanning every row before it
+        page_queries = [query['sql'] for query in queries if 'LIMIT' in query['sql']]
+        self.assertEqual(len(page_queries), 2)
+        for sql in page_queries:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+            self.assertIn('SEARCH api_product USING INDEX api_product_public_order_idx', plan)
+
+    def test_product_cursor_pagination_rejects_bad_cursor(self):
+        response = self.client.get('/api/products/', {'pagination': 'cursor', 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+    def test_product_card_view_and_sparse_fields(self):
+        response = self.client.get('/api/products/', {'view': 'card'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.json()['results'][0]),
+            {'id', 'name', 'slug', 'vertical', 'vertical_title', 'image', 'badge', 'stock_status'}
+        )
+
+        response = self.client.get('/api/products/', {'fields': 'name,slug'})
+        self.assertEqual(set(response.json()['results'][0]), {'name', 'slug'})
+
+        response = self.client.get('/api/products/', {'omit': 'description,features'})
+        self.assertNotIn('description', response.json()['results'][0])
+        self.assertIn('brand', response.json()['results'][0])
+
+        # Detail keeps the full representation
+        response = self.client.get('/api/products/product-1/', {'view': 'card', 'fields': 'name'})
+        self.assertIn('description', response.json())
+
+
+    def test_product_search_ranks_and_tolerates_typos(self):
+        Product.objects.bulk_create([
+            Product(
+                vertical=self.vertical, name='Golden Sella Basmati Rice', slug='golden-sella-basmati-rice',
+                description='Long grain parboiled rice', image='products/rice.jpg', moq='1 MT', packaging='25 kg bags',
+            ),
+            Product(
+                vertical=self.vertical, name='Jeera Rice', slug='jeera-rice',
+                description='Pairs well with basmati dishes', image='products/jeera.jpg', moq='1 MT', packaging='25 kg bags',
+            ),
+        ])
+
+        response = self.client.get('/api/products/search/', {'q': 'basmati'})
+        self.assertEqual(response.status_code, 200)
+        slugs = [item['slug'] for item in response.json()['results']]
+        # A name match outranks a description match
+        self.assertEqual(slugs[:2], ['golden-sella-basmati-rice', 'jeera-rice'])
+
+        response = self.client.get('/api/products/search/', {'q': 'basmatti', 'view': 'card'})
+        self.assertEqual(response.json()['results'][0]['slug'], 'golden-sella-basmati-rice')
+        self.assertNotIn('description', response.json()['results'][0])
+
+        response = self.client.get('/api/products/search/', {'q': ''})
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_typo_match_survives_many_weak_trigram_candidates(self):
+        Product.objects.bulk_create([Product(
+            vertical=self.vertical, name='Golden Sella Basmati Rice', slug='golden-sella-basmati-rice',
+            description='Long grain parboiled rice', image='products/rice.jpg', moq='1 MT', packaging='25 kg bags',
+        )])
+        # More names sharing one trigram ("mat") with the query than the
+        # SQLite shortlist holds, and newer, so first in catalogue order
+        Product.objects.bulk_create([
+            Product(
+                vertical=self.vertical, name=f'Matcha Powder {i}', slug=f'matcha-powder-{i}',
+                description='Green tea', image='products/tea.jpg', moq='1 MT', packaging='25 kg bags',
+            )
+            for i in range(TRIGRAM_CANDIDATES + 50)
+        ])
+
+        self.assertEqual(
+            search_products('basmatti', limit=1)[0].slug, 'golden-sella-basmati-rice'
+        )
+
+
+    def test_product_browse_returns_facet_counts(self):
+        response = self.client.get('/api/products/browse/', {'vertical': self.vertical.id, 'view': 'card'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['results']), 10)
+
+        # The vertical facet ignores its own filter so the other choices stay visible
+        verticals = {entry['label']: entry['count'] for entry in data['facets']['vertical']}
+        self.assertEqual(verticals, {'Rice': 10, 'Spices': 10})
+        # Other facets are counted within the selected vertical
+        self.assertEqual(data['facets']['brand'], [
+            {'value': 'Westend Organic', 'label': 'Westend Organic', 'count': 10, 'selected': False}
+        ])
+
+        response = self.client.get('/api/products/browse/', {'brand': 'Nobody'})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_facet_rows_expire_with_local_cache(self):
+        # Other LocMem workers never see the catalogue version bump
+        with mock.patch('api.facets.cache') as cache:
+            cache.get.return_value = None
+            get_facet_rows()
+        self.assertEqual(cache.set.call_args.args[2], 300)
+
+
+    def test_product_batch_preserves_requested_order(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/batch/', {'slugs': 'product-5,product-2,missing,product-5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['slug'] for item in response.json()['results']], ['product-5', 'product-2'])
+        self.assertEqual(response.json()['missing'], ['missing'])
+
+        ids = list(Product.objects.filter(slug__in=['product-1', 'product-3']).values_list('id', flat=True))
+        response = self.client.get('/api/products/batch/', {'ids': f'{ids[1]},{ids[0]}'})
+        self.assertEqual([item['id'] for item in response.json()['results']], [ids[1], ids[0]])
+
+        response = self.client.get('/api/products/batch/', {'ids': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/products/batch/', {'ids': '\u00b2'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_search_triggers_are_recreated(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite FTS5 triggers only')
+        # What a table remake (e.g. a future AlterField) does to the triggers
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER api_product_fts_au')
+        self.assertEqual(missing_search_objects(), ['api_product_fts_au'])
+        Product.objects.filter(slug='product-3').update(name='Kashmiri saffron')
+
+        self.assertEqual(ensure_search_index(), ['api_product_fts_au'])
+        self.assertEqual(missing_search_objects(), [])
+        product_id = Product.objects.get(slug='product-3').id
+        self.assertEqual(search_product_ids('saffron')[:1], [product_id])
+
+    def test_browse_ignores_non_decimal_vertical_ids(self):
+        response = self.client.get('/api/products/browse/', {'vertical': '\u00b2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_slug_allocation_uses_one_query(self):
+        Product.objects.filter(slug='product-3').update(slug='product-3-1')
+        Product.objects.filter(slug='product-4').update(slug='product-3')
+        with self.assertNumQueries(1):
+            slug = Product(name='Product 3').allocate_slug()
+        self.assertEqual(slug, 'product-3-2')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Product(name='Brand new rice').allocate_slug(), 'brand-new-rice')
+        self.assertEqual(Product(name='!!!').allocate_slug(), 'product')
+
+
+class PageVisitIngestionTests(TestCase):
+    """Beacons are queued on the request path and bulk inserted on flush"""
+
+    def setUp(self):
+        # No background thread: the test flushes explicitly
+        patcher = mock.patch.object(VisitWriteBuffer, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.buffer = VisitWriteBuffer()
+        self.buffer.enabled = True
+        patcher = mock.patch('api.views.visit_writes', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Interned ids would outlive the rolled-back test transaction
+        self.addCleanup(user_agents.clear)
+        self.addCleanup(referrers.clear)
+
+    def test_batch_is_queued_then_bulk_inserted(self):
+        with self.assertNumQueries(0):
+            response = self.client.post('/api/page-visit/', {'events': [
+                {'page': 'home'},
+                {'page': 'product_detail', 'action': 'product_view', 'product': 987654},
+                {'page': 'contact', 'action': 'not-an-action'},
+            ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['accepted'], 2)
+        self.assertEqual(response.json()['rejected'], 1)
+        self.assertFalse(PageVisit.objects.exists())
+
+        self.buffer.flush()
+        visits = list(PageVisit.objects.order_by('id').values_list('page', 'action', 'product_id'))
+        # The unknown product id is dropped rather than failing the batch
+        self.assertEqual(visits, [('home', 'page_view', None), ('product_detail', 'product_view', None)])
+
+    def test_single_event_and_limits(self):
+        response = self.client.post('/api/page-visit/', {'page_name': 'about'}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+
+        response = self.client.post('/api/page-visit/', {'events': [{'page': 'home'}] * 51},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.buffer.flush()
+        self.assertEqual(PageVisit.objects.count(), 1)
+
+    def test_rollups_follow_ingestion(self):
+        for _ in range(2):
+            self.client.post('/api/page-visit/', {'events': [{'page': 'home'}, {'page': 'home'}, {'page': 'about'}]},
+                             content_type='application/json')
+            self.buffer.flush()
+
+        # The second batch increments the rows created by the first
+        self.assertEqual(PageVisitHourly.objects.count(), 2)
+        self.assertEqual(PageVisitDaily.objects.get(page='home').count, 4)
+        totals = visit_totals()
+        self.assertEqual((totals['total_visits'], totals['today_visits'], totals['unique_pages']), (6, 6, 2))
+        self.assertEqual(totals['popular_pages'][0], {'page': 'home', 'visit_count': 4})
+
+        # Rebuilding from the raw rows gives the same counts
+        self.assertEqual(rebuild_rollups(), 6)
+        self.assertEqual(PageVisitDaily.objects.get(page='home').count, 4)
+        self.assertEqual(visit_totals()['last_24h_visits'], 6)
+
+    def test_archive_moves_old_visits_to_gzip_csv(self):
+        old = timezone.now() - timedelta(days=100)
+        PageVisit.objects.bulk_create(
+            [PageVisit(page='home', timestamp=old) for _ in range(3)]
+            + [PageVisit(page='about', timestamp=timezone.now())]
+        )
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command('archive_page_visits', days=90, chunk_size=2, archive_dir=archive_dir, stdout=mock.Mock())
+            archives = list(Path(archive_dir).glob('*.csv.gz'))
+            self.assertEqual(len(archives), 1)
+            with gzip.open(archives[0], 'rt', newline='') as archive:
+                rows = list(csv.DictReader(archive))
+
+        self.assertEqual([row['page'] for row in rows], ['home'] * 3)
+        self.assertEqual(list(PageVisit.objects.values_list('page', flat=True)), ['about'])
+        # The archived visits were rolled up before they were deleted
+        self.assertEqual(PageVisitDaily.objects.get(day=timezone.localdate(old)).count, 3)
+
+    def test_rollup_after_archive_keeps_archived_days(self):
+        old = timezone.now() - timedelta(days=100)
+        PageVisit.objects.bulk_create(
+            [PageVisit(page='home', timestamp=old) for _ in range(3)]
+            + [PageVisit(page='about', timestamp=timezone.now() - timedelta(hours=2))]
+        )
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command('archive_page_visits', days=90, archive_dir=archive_dir, stdout=mock.Mock())
+        call_command('rollup_page_visits', stdout=mock.Mock())
+
+        # The raw rows are gone, so the rebuild must leave their rollups alone
+        self.assertEqual(
+            list(PageVisitDaily.objects.filter(page='home').values_list('day', 'count')),
+            [(timezone.localdate(old), 3)]
+        )
+        self.assertEqual(PageVisitDaily.objects.get(page='about').count, 1)
+
+    def test_middleware_deduplicates_without_queries(self):
+        middleware = VisitorTrackingMiddleware(lambda request: HttpResponse('ok'))
+        factory = RequestFactory()
+        with mock.patch('api.middleware.visit_writes', self.buffer), \
+                mock.patch('api.middleware.recent_visits', RecentVisits()):
+            with self.assertNumQueries(0):
+                visitor_id = middleware(factory.get('/products/rice/')).cookies['visitor_id'].value
+                for path in ['/products/rice/', '/about/', '/api/products/']:
+                    request = factory.get(path)
+                    request.COOKIES['visitor_id'] = visitor_id
+                    middleware(request)
+
+        self.buffer.flush()
+        self.assertEqual(
+            sorted(PageVisit.objects.values_list('page', 'session_id')),
+            [('/about/', visitor_id), ('/products/rice/', visitor_id)]
+        )
+
+    def test_user_agents_and_referrers_are_interned(self):
+        browser = 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Version/17.0 Mobile/15E148 Safari/604.1'
+        crawler = 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
+        for user_agent in [browser, browser, crawler]:
+            self.client.post('/api/page-visit/', {'page': 'home'}, content_type='application/json',
+                             HTTP_USER_AGENT=user_agent, HTTP_REFERER='https://www.google.com/search?q=rice')
+            self.buffer.flush()
+
+        self.assertEqual(UserAgent.objects.count(), 2)
+        self.assertEqual(Referrer.objects.get().host, 'www.google.com')
+        agent = UserAgent.objects.get(user_agent=browser)
+        self.assertEqual((agent.browser, agent.os, agent.device_type, agent.is_bot), ('Safari', 'iOS', 'mobile', False))
+        self.assertEqual(PageVisit.objects.filter(user_agent__is_bot=True).count(), 1)
+        self.assertEqual(PageVisit.objects.filter(referrer__path='/search').count(), 3)
@@ -0,0 +1,83 @@
+"""
+Parsing for the PageVisit dimension tables (UserAgent, Referrer).
+
+Plain functions with no model imports, so migrations can use them too.
+"""
+import hashlib
+import re
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+USER_AGENT_MAX_LENGTH = 500
+REFERRER_HOST_MAX_LENGTH = 255
+REFERRER_PATH_MAX_LENGTH = 500
+
+BOT_PATTERN = re.compile(
+    r'bot|crawl|spider|slurp|facebookexternalhit|embedly|preview|monitor|lighthouse|'
+    r'headless|curl|wget|python-requests|httpclient|go-http-client|axios',
+    re.IGNORECASE,
+)
+TABLET_PATTERN = re.compile(r'ipad|tablet|kindle|silk', re.IGNORECASE)
+MOBILE_PATTERN = re.compile(r'mobi|iphone|ipod|android|opera mini', re.IGNORECASE)
+
+# First match wins, so more specific tokens come first
+BROWSERS = [
+    ('Edge', 'Edg'), ('Opera', 'OPR/'), ('Samsung Internet', 'SamsungBrowser'),
+    ('Chrome', 'Chrome/'), ('Chrome', 'CriOS'), ('Firefox', 'Firefox/'), ('Firefox', 'FxiOS'),
+    ('Safari', 'Safari/'),
+]
+OPERATING_SYSTEMS = [
+    ('Android', 'Android'), ('iOS', 'iPhone'), ('iOS', 'iPad'), ('Windows', 'Windows'),
+    ('macOS', 'Mac OS X'), ('ChromeOS', 'CrOS'), ('Linux', 'Linux'),
+]
+
+
+def dimension_hash(*parts: str) -> str:
+    """Unique key for a dimension row; text columns are too long to index portably"""
+    return hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+
+def classify_user_agent(user_agent: str) -> Dict:
+    """Browser, OS, device type and bot flag for a User-Agent header"""
+    user_agent = user_agent[:USER_AGENT_MAX_LENGTH]
+    is_bot = bool(BOT_PATTERN.search(user_agent))
+    if is_bot:
+        device_type = 'bot'
+    elif TABLET_PATTERN.search(user_agent):
+        device_type = 'tablet'
+    elif MOBILE_PATTERN.search(user_agent):
+        device_type = 'mobile'
+    elif user_agent:
+        device_type = 'desktop'
+    else:
+        device_type = 'unknown'
+
+    return {
+        'key_hash': dimension_hash(user_agent),
+        'user_agent': user_agent,
+        'browser': next((name for name, token in BROWSERS if token in user_agent), ''),
+        'os': next((name for name, token in OPERATING_SYSTEMS if token in user_agent), ''),
+        'device_type': device_type,
+        'is_bot': is_bot,
+    }
+
+
+def split_referrer(url: str) -> Optional[Tuple[str, str]]:
+    """(host, path) of a referrer URL; the query string is dropped"""
+    try:
+        parts = urlsplit((url or '').strip())
+    except ValueError:
+        return None
+    host = (parts.hostname or '')[:REFERRER_HOST_MAX_LENGTH]
+    if not host:
+        return None
+    return host, (parts.path or '/')[:REFERRER_PATH_MAX_LENGTH]
+
+
+def referrer_fields(url: str) -> Optional[Dict]:
+    """Referrer row fields for ``url``, or None if it has no host"""
+    split = split_referrer(url)
+    if split is None:
+        return None
+    host, path = split
+    return {'key_hash': dimension_hash(host, path), 'host': host, 'path': path}
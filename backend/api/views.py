@@ -7,29 +7,56 @@ from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from django.core.mail import EmailMessage
 import logging
-from .models import Vertical, Product, ContactInquiry, QuoteRequest, Feature, CompanyInfo, PageVisit, HeroSlide, Certification, PageBackground, SectionBackground, ProductCategory, Brochure
+from .models import Vertical, Product, ContactInquiry, QuoteRequest, Feature, CompanyInfo, HeroSlide, Certification, PageBackground, SectionBackground, ProductCategory, Brochure
 from .serializers import (
-    VerticalSerializer, ProductSerializer,
+    VerticalSerializer, ProductSerializer, ProductCardSerializer,
     ContactInquirySerializer, QuoteRequestSerializer,
     FeatureSerializer, CompanyInfoSerializer, HeroSlideSerializer, CertificationSerializer,
     PageBackgroundSerializer, SectionBackgroundSerializer, ProductCategorySerializer, BrochureSerializer
 )
+from .response_cache import CachedJSONResponseMixin, ConditionalGetMixin
+from .pagination import ProductKeysetPagination
+from .search import search_products
+from .facets import compute_facets, filter_products, parse_facet_filters
+from .visits import MAX_EVENTS_PER_REQUEST, parse_visit_event, visit_writes
 
-class VerticalViewSet(viewsets.ReadOnlyModelViewSet):
+class VerticalViewSet(CachedJSONResponseMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for product verticals/categories"""
-    queryset = Vertical.objects.filter(is_active=True).order_by('order', 'title')
+    queryset = Vertical.objects.filter(is_active=True).order_by('order', 'title').prefetch_related('products')
     serializer_class = VerticalSerializer
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for products"""
     # Only show PUBLIC products on the website
-    queryset = Product.objects.filter(is_active=True, is_public=True)
+    # select_related: ProductSerializer reads vertical.title for every row
+    queryset = Product.objects.filter(is_active=True, is_public=True).select_related('vertical')
     serializer_class = ProductSerializer
     lookup_field = 'slug'
     
+    @property
+    def paginator(self):
+        # ?pagination=cursor opts in to keyset pages for infinite scroll
+        if not hasattr(self, '_paginator') and self.request is not None \
+                and self.request.query_params.get('pagination') == 'cursor':
+            self._paginator = ProductKeysetPagination()
+        return super().paginator
+    
+    def _wants_card(self):
+        return self.action in ('list', 'search', 'browse', 'batch') and self.request.query_params.get('view') == 'card'
+    
+    def get_serializer_class(self):
+        # ?view=card returns the compact grid representation on list
+        if self._wants_card():
+            return ProductCardSerializer
+        return super().get_serializer_class()
+    
     def get_queryset(self):
         queryset = super().get_queryset()
         
+        # Don't load descriptions and other long text for cards
+        if self._wants_card():
+            queryset = queryset.only(*ProductCardSerializer.load_fields)
+        
         # Filter by category if specified
         category = self.request.query_params.get('category', None)
         if category:
@@ -41,6 +68,73 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(is_featured=True).order_by('featured_order', 'order', 'name')
         
         return queryset
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Relevance-ranked product search: /api/products/search/?q=basmati&limit=20"""
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+        except ValueError:
+            limit = 20
+        
+        products = search_products(query, limit) if query else []
+        serializer = self.get_serializer(products, many=True)
+        return Response({
+            'query': query,
+            'count': len(products),
+            'results': serializer.data
+        })
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """
+        Fetch many products in one request, in the order asked for:
+        /api/products/batch/?slugs=a,b,c or /api/products/batch/?ids=3,1,2
+        """
+        max_items = 100
+        slugs = [value.strip() for value in request.query_params.get('slugs', '').split(',') if value.strip()]
+        ids = [value.strip() for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        
+        if slugs and ids:
+            return Response({'error': 'Use either slugs or ids, not both'}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids and not slugs:
+            return Response({'error': 'slugs or ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        # isdecimal, not isdigit: superscripts like '²' are digits that int() rejects;
+        # the length cap keeps ids within a 64-bit column
+        if any(not value.isdecimal() or len(value) > 18 for value in ids):
+            return Response({'error': 'ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Duplicates are returned once, at their first position
+        if slugs:
+            keys = list(dict.fromkeys(slugs))[:max_items]
+            products = {p.slug: p for p in self.get_queryset().filter(slug__in=keys)}
+        else:
+            keys = list(dict.fromkeys(int(value) for value in ids))[:max_items]
+            products = {p.id: p for p in self.get_queryset().filter(id__in=keys)}
+        
+        found = [products[key] for key in keys if key in products]
+        return Response({
+            'results': self.get_serializer(found, many=True).data,
+            'missing': [key for key in keys if key not in products]
+        })
+    
+    @action(detail=False, methods=['get'])
+    def browse(self, request):
+        """
+        Faceted browsing: /api/products/browse/?brand=Amul&stock_status=in_stock
+        
+        Returns a page of matching products plus counts for every value of
+        vertical, brand, stock_status, badge, origin and certification.
+        """
+        selected = parse_facet_filters(request.query_params)
+        queryset = filter_products(self.filter_queryset(self.get_queryset()), selected)
+        
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        response.data['facets'] = compute_facets(selected)
+        return response
 
 @api_view(['POST'])
 @csrf_exempt
@@ -191,7 +285,12 @@ def quote_request(request):
 @api_view(['POST'])
 @csrf_exempt
 def page_visit(request):
-    """Record a page visit or action from the frontend"""
+    """
+    Record page visits or actions from the frontend.
+
+    Accepts one event object, or a batch as ``{"events": [...]}``. Events are
+    queued and written in bulk by ``visit_writes``.
+    """
     headers = {
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'POST, OPTIONS',
@@ -200,60 +299,63 @@ def page_visit(request):
 
     try:
         data = request.data if hasattr(request, 'data') else {}
-        page = data.get('page') or data.get('page_name') or 'home'
-        action = data.get('action', 'page_view')
-        session_id = data.get('session_id', '')
-        product_id = data.get('product')
+        events = data.get('events') if isinstance(data, dict) and 'events' in data else [data]
+        if not isinstance(events, list) or not 0 < len(events) <= MAX_EVENTS_PER_REQUEST:
+            return Response({
+                'success': False,
+                'message': f'Send between 1 and {MAX_EVENTS_PER_REQUEST} events.'
+            }, status=status.HTTP_400_BAD_REQUEST, headers=headers)
 
         ip = request.META.get('REMOTE_ADDR') or request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip()
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         referrer = request.META.get('HTTP_REFERER', '')
 
-        pv = PageVisit.objects.create(
-            page=page,
-            action=action,
-            session_id=session_id,
-            ip_address=ip or None,
-            user_agent=user_agent,
-            referrer=referrer or None,
-            product=Product.objects.filter(id=product_id).first() if product_id else None,
-        )
+        visits = [parse_visit_event(event, ip, user_agent, referrer) for event in events]
+        accepted = [visit for visit in visits if visit is not None]
+        if not accepted:
+            return Response({'success': False, 'message': 'Invalid event.'},
+                            status=status.HTTP_400_BAD_REQUEST, headers=headers)
+        visit_writes.add(accepted)
 
-        return Response({'success': True, 'id': pv.id}, status=status.HTTP_201_CREATED, headers=headers)
+        return Response({
+            'success': True,
+            'accepted': len(accepted),
+            'rejected': len(visits) - len(accepted),
+        }, status=status.HTTP_202_ACCEPTED, headers=headers)
     except Exception:
         logging.getLogger(__name__).exception('Failed to record page visit')
         return Response({'success': False}, status=status.HTTP_500_INTERNAL_SERVER_ERROR, headers=headers)
 
 
-class FeatureViewSet(viewsets.ReadOnlyModelViewSet):
+class FeatureViewSet(CachedJSONResponseMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for about section features"""
     queryset = Feature.objects.filter(is_active=True).order_by('order')
     serializer_class = FeatureSerializer
 
 
-class CompanyInfoViewSet(viewsets.ReadOnlyModelViewSet):
+class CompanyInfoViewSet(CachedJSONResponseMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for company information"""
     queryset = CompanyInfo.objects.all()
     serializer_class = CompanyInfoSerializer
 
-class HeroSlideViewSet(viewsets.ReadOnlyModelViewSet):
+class HeroSlideViewSet(CachedJSONResponseMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for hero carousel slides"""
     queryset = HeroSlide.objects.filter(is_active=True).order_by('order')
     serializer_class = HeroSlideSerializer
 
-class CertificationViewSet(viewsets.ReadOnlyModelViewSet):
+class CertificationViewSet(CachedJSONResponseMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for certifications"""
     queryset = Certification.objects.filter(is_active=True).order_by('order')
     serializer_class = CertificationSerializer
     pagination_class = None  # Return all slides
 
-class PageBackgroundViewSet(viewsets.ReadOnlyModelViewSet):
+class PageBackgroundViewSet(CachedJSONResponseMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for page backgrounds"""
     queryset = PageBackground.objects.filter(is_active=True)
     serializer_class = PageBackgroundSerializer
     pagination_class = None
 
-class SectionBackgroundViewSet(viewsets.ReadOnlyModelViewSet):
+class SectionBackgroundViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for section backgrounds"""
     serializer_class = SectionBackgroundSerializer
     
@@ -264,7 +366,7 @@ class SectionBackgroundViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(section=section)
         return queryset.first() if queryset.exists() else SectionBackground.objects.none()
 
-class ProductCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductCategoryViewSet(CachedJSONResponseMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for product categories sidebar"""
     queryset = ProductCategory.objects.filter(is_active=True).prefetch_related('subcategories')
     serializer_class = ProductCategorySerializer
@@ -275,7 +377,7 @@ class ProductCategoryViewSet(viewsets.ReadOnlyModelViewSet):
         ).order_by('order', 'title')
 
 
-class BrochureViewSet(viewsets.ReadOnlyModelViewSet):
+class BrochureViewSet(CachedJSONResponseMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for brochures/catalogs"""
     queryset = Brochure.objects.filter(is_active=True).order_by('-created_at')
     serializer_class = BrochureSerializer
@@ -0,0 +1,281 @@
+"""
+Batched ingestion of PageVisit events.
+
+Frontend beacons are validated cheaply on the request path and appended to
+a per-worker in-memory queue. A background thread writes the queue every
+few seconds with one ``bulk_create``; product ids are checked with one
+``IN`` query per batch instead of a lookup per event, user agents and
+referrers are interned into their dimension tables through per-worker
+caches, and the hourly/daily rollups are updated in the same transaction.
+The queue is flushed again when the worker exits.
+
+Set ``VISIT_WRITE_BEHIND = False`` to write synchronously (e.g. in tests).
+
+``RecentVisits`` answers "was this visitor on this page in the last 30
+minutes?" for VisitorTrackingMiddleware without touching the database.
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Set
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from .catalogue import cache_is_shared
+from .models import PageVisit, Product, Referrer, UserAgent
+from .rollups import record_visits
+from .useragents import USER_AGENT_MAX_LENGTH, classify_user_agent, referrer_fields
+
+logger = logging.getLogger(__name__)
+
+# Most events one request may carry
+MAX_EVENTS_PER_REQUEST = 50
+
+ACTIONS = {choice for choice, _ in PageVisit.ACTION_CHOICES}
+
+
+def _field_length(name: str) -> int:
+    return PageVisit._meta.get_field(name).max_length
+
+
+def parse_visit_event(data, ip_address=None, user_agent='', referrer='') -> Optional[PageVisit]:
+    """
+    Build an unsaved PageVisit from a beacon payload, or return None if it is
+    malformed. Request metadata is passed in by the caller.
+    """
+    if not isinstance(data, dict):
+        return None
+    page = data.get('page') or data.get('page_name') or 'home'
+    action = data.get('action') or 'page_view'
+    session_id = data.get('session_id') or ''
+    product_id = data.get('product')
+    if not all(isinstance(value, str) for value in (page, action, session_id)) or action not in ACTIONS:
+        return None
+    if product_id in ('', None):
+        product_id = None
+    else:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return None
+
+    visit = PageVisit(
+        page=page[:_field_length('page')],
+        action=action,
+        session_id=session_id[:_field_length('session_id')],
+        ip_address=ip_address or None,
+        product_id=product_id,
+    )
+    # Resolved to UserAgent / Referrer rows when the batch is written
+    visit.user_agent_string = (user_agent or '')[:USER_AGENT_MAX_LENGTH]
+    visit.referrer_url = referrer or ''
+    return visit
+
+
+class DimensionInterner:
+    """
+    Maps raw strings to dimension row ids, creating rows on first sight.
+
+    A bounded per-worker LRU answers repeat values (nearly all traffic comes
+    from a few hundred browsers); misses cost one SELECT by ``key_hash`` and,
+    for values never seen before, one INSERT.
+    """
+
+    def __init__(self, model, build, max_size: int = 10000):
+        self.model = model
+        self.build = build  # raw value -> row fields (including key_hash), or None to skip
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._ids: OrderedDict = OrderedDict()  # raw value -> id
+
+    def resolve(self, values) -> Dict[str, int]:
+        """Ids for ``values`` (values that build() rejects are left out)"""
+        result, missing = {}, []
+        with self._lock:
+            for value in set(values):
+                pk = self._ids.get(value)
+                if pk is None:
+                    missing.append(value)
+                else:
+                    self._ids.move_to_end(value)
+                    result[value] = pk
+        if not missing:
+            return result
+
+        # Several raw values can share a row (e.g. referrers differing only in query string)
+        fields_by_hash, values_by_hash = {}, defaultdict(list)
+        for value in missing:
+            fields = self.build(value)
+            if fields is not None:
+                fields_by_hash[fields['key_hash']] = fields
+                values_by_hash[fields['key_hash']].append(value)
+
+        found = dict(self.model.objects.filter(key_hash__in=fields_by_hash).values_list('key_hash', 'id'))
+        new = [key for key in fields_by_hash if key not in found]
+        if new:
+            # ignore_conflicts: another worker may insert the same row first
+            self.model.objects.bulk_create([self.model(**fields_by_hash[key]) for key in new], ignore_conflicts=True)
+            found.update(self.model.objects.filter(key_hash__in=new).values_list('key_hash', 'id'))
+
+        with self._lock:
+            for key, pk in found.items():
+                for value in values_by_hash[key]:
+                    result[value] = pk
+                    self._ids[value] = pk
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+user_agents = DimensionInterner(UserAgent, lambda value: classify_user_agent(value) if value else None)
+referrers = DimensionInterner(Referrer, referrer_fields)
+
+
+class VisitWriteBuffer:
+    """Queues PageVisit rows and writes them in batches"""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'VISIT_WRITE_BEHIND', True)
+        self.flush_interval = getattr(settings, 'VISIT_WRITE_BEHIND_INTERVAL', 5.0)
+        self.max_pending = getattr(settings, 'VISIT_WRITE_BEHIND_MAX_PENDING', 500)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._visits: List[PageVisit] = []
+        self._wakeup = threading.Event()
+        self._pid = None
+        atexit.register(self.flush)
+
+    def _ensure_flusher(self):
+        # Started lazily, and again after a fork, so each worker has its own thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._run, name='visit-write-behind', daemon=True)
+            thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def add(self, visits: List[PageVisit]):
+        """Queue unsaved PageVisits; they are written on the next flush"""
+        if not visits:
+            return
+        if not self.enabled:
+            self._write(visits)
+            return
+
+        self._ensure_flusher()
+        with self._lock:
+            self._visits.extend(visits)
+            full = len(self._visits) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def _write(self, visits: List[PageVisit]):
+        # Dimension rows are committed on their own, before the batch, so a
+        # failed batch can't leave rolled-back ids in the interner caches
+        agent_ids = user_agents.resolve(getattr(visit, 'user_agent_string', '') for visit in visits)
+        referrer_ids = referrers.resolve(getattr(visit, 'referrer_url', '') for visit in visits)
+        for visit in visits:
+            if visit.user_agent_id is None:
+                visit.user_agent_id = agent_ids.get(getattr(visit, 'user_agent_string', ''))
+            if visit.referrer_id is None:
+                visit.referrer_id = referrer_ids.get(getattr(visit, 'referrer_url', ''))
+
+        # Events for deleted (or made-up) products are kept without the product
+        product_ids = {visit.product_id for visit in visits if visit.product_id}
+        if product_ids:
+            existing = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+            for visit in visits:
+                if visit.product_id and visit.product_id not in existing:
+                    visit.product_id = None
+        with transaction.atomic():
+            PageVisit.objects.bulk_create(visits, batch_size=500)
+            record_visits(visits)
+
+    def flush(self):
+        """Write everything queued so far"""
+        with self._flush_lock:
+            with self._lock:
+                visits, self._visits = self._visits, []
+            if not visits:
+                return
+
+            close_old_connections()
+            try:
+                self._write(visits)
+            except Exception as e:
+                for visit in visits:
+                    visit.pk = None
+                # Ids cached during a failed flush may not exist; look them up again
+                user_agents.clear()
+                referrers.clear()
+                with self._lock:
+                    if len(self._visits) + len(visits) > self.max_pending * 10:
+                        # Don't grow without bound while the database is unavailable
+                        logger.error(f"Page visit flush failed, dropping {len(visits)} visits: {e}")
+                    else:
+                        logger.error(f"Page visit flush failed, will retry: {e}")
+                        self._visits = visits + self._visits
+
+
+class RecentVisits:
+    """
+    Time-bucketed sets of (visitor, path) keys seen within ``window`` seconds.
+
+    The window is split into buckets; a key counts as seen if any live bucket
+    holds it, and whole buckets expire at once, so there is no per-key
+    bookkeeping. Each bucket holds at most ``max_keys`` keys: past that,
+    visits are recorded without deduplication rather than growing memory.
+    A shared cache (Redis) extends the check across workers. It is skipped
+    with a per-process cache: that would not dedupe across workers either,
+    and one key per visitor/path would evict the small LocMem cache's
+    response and AI entries.
+    """
+
+    def __init__(self):
+        self.window = getattr(settings, 'VISIT_DEDUP_WINDOW', 30 * 60)
+        self.bucket_seconds = max(1, self.window // 6)
+        self.max_keys = getattr(settings, 'VISIT_DEDUP_MAX_KEYS', 50000)
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, Set[str]] = {}
+
+    def seen(self, visitor: str, path: str) -> bool:
+        """Return True if the pair was seen within the window, and remember it otherwise"""
+        key = hashlib.md5(f"{visitor}:{path}".encode()).hexdigest()
+        current = int(time.time()) // self.bucket_seconds
+        # One extra bucket, so a key always stays live for at least the full window
+        oldest = current - self.window // self.bucket_seconds
+        with self._lock:
+            for bucket in [b for b in self._buckets if b < oldest]:
+                del self._buckets[bucket]
+            if any(key in keys for keys in self._buckets.values()):
+                return True
+            keys = self._buckets.setdefault(current, set())
+            if len(keys) < self.max_keys:
+                keys.add(key)
+
+        if not cache_is_shared():
+            return False
+        # False if another worker already recorded it
+        return not cache.add(f"visit_seen_{key}", 1, self.window)
+
+
+# Global instances, one per worker process
+visit_writes = VisitWriteBuffer()
+recent_visits = RecentVisits()
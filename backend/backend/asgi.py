@@ -3,6 +3,9 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run with ``SERVER_MODE=asgi gunicorn_start.sh`` (Uvicorn workers) so the async
+chat endpoint can serve many concurrent AI calls per worker process.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
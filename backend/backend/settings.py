@@ -37,6 +37,19 @@ AI_MAX_TOKENS_PER_REQUEST = int(os.environ.get('AI_MAX_TOKENS_PER_REQUEST', '150
 AI_TEMPERATURE = float(os.environ.get('AI_TEMPERATURE', '0.3'))
 AI_DAILY_TOKEN_LIMIT = int(os.environ.get('AI_DAILY_TOKEN_LIMIT', '50000'))
 AI_ENABLE_CACHING = os.environ.get('AI_ENABLE_CACHING', 'True').lower() == 'true'
+AI_SINGLE_FLIGHT_TIMEOUT = int(os.environ.get('AI_SINGLE_FLIGHT_TIMEOUT', '30'))
+
+# Chat persistence: buffer messages and session activity, flushing every few seconds
+CHAT_WRITE_BEHIND = os.environ.get('CHAT_WRITE_BEHIND', 'True').lower() == 'true'
+CHAT_WRITE_BEHIND_INTERVAL = float(os.environ.get('CHAT_WRITE_BEHIND_INTERVAL', '2'))
+
+# Page visit beacons: queued per worker and bulk inserted every few seconds
+VISIT_WRITE_BEHIND = os.environ.get('VISIT_WRITE_BEHIND', 'True').lower() == 'true'
+VISIT_WRITE_BEHIND_INTERVAL = float(os.environ.get('VISIT_WRITE_BEHIND_INTERVAL', '5'))
+# Raw visits older than this are archived to gzip CSV by archive_page_visits
+VISIT_RETENTION_DAYS = int(os.environ.get('VISIT_RETENTION_DAYS', '90'))
+VISIT_ARCHIVE_DIR = os.environ.get('VISIT_ARCHIVE_DIR', str(BASE_DIR.parent / 'data/archive/page_visits'))
+
 if not SECRET_KEY:
     raise ValueError(
         "SECRET_KEY environment variable is not set! "
@@ -76,7 +89,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'api.middleware.DisableCSRFMiddleware',  # Custom middleware to disable CSRF for API routes
-    # 'api.middleware.VisitorTrackingMiddleware',  # Custom middleware for visitor tracking
+    'api.middleware.VisitorTrackingMiddleware',  # Visitor tracking (in-memory dedup, batched inserts)
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -126,6 +139,26 @@ else:
     }
 
 
+# Cache
+# Set REDIS_URL to share caches (AI responses, catalogue versions, in-flight
+# AI request locks) between gunicorn workers. Without it each worker keeps
+# its own in-memory cache.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
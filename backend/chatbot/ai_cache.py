@@ -0,0 +1,87 @@
+"""
+Shared cache for AI responses.
+
+Keys are content-addressed (SHA-256) from the normalized question, the model,
+the temperature and the catalogue version, so they are identical across
+workers and restarts, near-duplicate questions share an entry, and answers
+are dropped automatically when the catalogue changes.
+"""
+
+import hashlib
+import json
+from typing import Dict, Optional
+from django.core.cache import cache
+from api.catalogue import get_catalogue_version
+from .search_index import normalize_text
+
+HITS_KEY = 'ai_cache_hits'
+MISSES_KEY = 'ai_cache_misses'
+TOKENS_SAVED_KEY = 'ai_cache_tokens_saved'
+
+
+def _increment(key: str, delta: int = 1):
+    """Increment a counter in the cache, creating it if missing"""
+    if delta <= 0:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+class AIResponseCache:
+    """Cache of AI answers keyed by what was actually asked"""
+
+    key_prefix = 'ai_response_v2'
+
+    def __init__(self, model: str, temperature: float):
+        self.model = model
+        self.temperature = temperature
+
+    def normalize_question(self, message: str) -> str:
+        """Collapse case, whitespace and punctuation so near-duplicates match"""
+        return normalize_text(message)
+
+    def make_key(self, message: str) -> str:
+        payload = json.dumps([
+            self.normalize_question(message),
+            self.model,
+            self.temperature,
+            get_catalogue_version(),
+        ])
+        return f"{self.key_prefix}_{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def get(self, message: str, count: bool = True) -> Optional[Dict]:
+        """
+        Return ``{'response': ..., 'tokens_used': ...}`` or None.
+
+        ``count=False`` skips the hit/miss counters, for internal re-checks
+        such as waiting on an in-flight request.
+        """
+        entry = cache.get(self.make_key(message))
+        if isinstance(entry, str):
+            entry = {'response': entry, 'tokens_used': 0}
+
+        if count:
+            if entry:
+                _increment(HITS_KEY)
+                _increment(TOKENS_SAVED_KEY, entry.get('tokens_used', 0))
+            else:
+                _increment(MISSES_KEY)
+        return entry or None
+
+    def set(self, message: str, response: str, tokens_used: int, timeout: int):
+        cache.set(self.make_key(message), {'response': response, 'tokens_used': tokens_used}, timeout)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters since the cache was last flushed (GET /api/chat/stats/ai-cache/)"""
+        hits = cache.get(HITS_KEY, 0)
+        misses = cache.get(MISSES_KEY, 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 3) if total else 0.0,
+            'tokens_saved': cache.get(TOKENS_SAVED_KEY, 0),
+        }
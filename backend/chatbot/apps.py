@@ -5,3 +5,7 @@ class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
     verbose_name = 'AI Chatbot'
+    
+    def ready(self):
+        """Import signals when app is ready"""
+        import chatbot.signals
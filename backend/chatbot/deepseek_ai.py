@@ -3,23 +3,41 @@ DeepSeek AI Integration Service for Westend Corporation Chatbot
 Cost-optimized AI responses with database integration
 """
 
+import asyncio
 import logging
 import json
-from typing import Dict, Optional, List
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional, List, Tuple
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.cache import cache
-from openai import OpenAI
-from api.models import Vertical, Product
+from django.db.models import Count, Q
+from openai import OpenAI, AsyncOpenAI
+from api.catalogue import get_catalogue_version, versioned_cache_timeout
+from api.models import Vertical
 from .models import ChatMessage
+from .ai_cache import AIResponseCache
+from .singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Used in the system prompt when the catalogue can't be read
+DATABASE_CONTEXT_UNAVAILABLE = "Error retrieving database context"
+
 
 class DeepSeekAIService:
     """DeepSeek AI service for intelligent chatbot responses"""
     
     def __init__(self):
         self.client = None
+        self._async_client = None
+        self._async_client_loop = None
+        self._database_context = None  # (catalogue version, built at, rendered context)
+        self.single_flight = SingleFlight(
+            lock_timeout=getattr(settings, 'AI_SINGLE_FLIGHT_TIMEOUT', 30),
+            wait_timeout=getattr(settings, 'AI_SINGLE_FLIGHT_TIMEOUT', 30)
+        )
         self.api_key = getattr(settings, 'DEEPSEEK_API_KEY', '')
         self.api_base = getattr(settings, 'DEEPSEEK_API_BASE', 'https://api.deepseek.com/v1')
         self.model = getattr(settings, 'DEEPSEEK_MODEL', 'deepseek-chat')
@@ -27,6 +45,7 @@ class DeepSeekAIService:
         self.temperature = getattr(settings, 'AI_TEMPERATURE', 0.3)
         self.daily_limit = getattr(settings, 'AI_DAILY_TOKEN_LIMIT', 100000)
         self.enable_caching = getattr(settings, 'AI_ENABLE_CACHING', True)
+        self.response_cache = AIResponseCache(self.model, self.temperature)
         
         if self.api_key:
             try:
@@ -42,6 +61,33 @@ class DeepSeekAIService:
             logger.warning("DeepSeek API key not configured")
             self.client = None
     
+    @asynccontextmanager
+    async def async_client(self) -> AsyncIterator[AsyncOpenAI]:
+        """
+        Async client for the running event loop.
+        
+        A client's connection pool belongs to the loop it is used on. Under
+        ASGI every request runs on the worker's one loop, so once a loop is
+        seen a second time a client is kept for it and reused. Under WSGI each
+        async view runs in its own short-lived loop, so the client is created
+        for the call and closed before that loop goes away.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client_loop is loop:
+            if self._async_client is None:
+                self._async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.api_base)
+            yield self._async_client
+            return
+        
+        previous, previous_loop = self._async_client, self._async_client_loop
+        self._async_client, self._async_client_loop = None, loop
+        if previous is not None and previous_loop.is_running():
+            # Its pool can only be closed from its own loop
+            asyncio.run_coroutine_threadsafe(previous.close(), previous_loop)
+        
+        async with AsyncOpenAI(api_key=self.api_key, base_url=self.api_base) as client:
+            yield client
+    
     def is_available(self) -> bool:
         """Check if DeepSeek AI is available"""
         return self.client is not None and bool(self.api_key)
@@ -63,12 +109,41 @@ class DeepSeekAIService:
             logger.warning(f"AI token usage at 80%: {daily_tokens}/{self.daily_limit}")
     
     def get_database_context(self) -> str:
-        """Get relevant database context for AI"""
+        """
+        Get relevant database context for AI.
+        
+        The context only changes with the catalogue, so it is built once per
+        catalogue version and shared between workers through the cache.
+        """
+        version = get_catalogue_version()
+        # With a per-process cache other workers never see a version bump,
+        # so the memo and the cached copy expire after a few minutes instead
+        timeout = versioned_cache_timeout(getattr(settings, 'AI_DATABASE_CONTEXT_TIMEOUT', 86400))
+        memoized = self._database_context
+        if memoized and memoized[0] == version and (timeout is None or time.monotonic() - memoized[1] < timeout):
+            return memoized[2]
+        
+        cache_key = f"ai_database_context_{version}"
+        context = cache.get(cache_key)
+        if context is None:
+            context = self._build_database_context()
+            if context is None:
+                # Not memoized, so the next message tries again
+                return DATABASE_CONTEXT_UNAVAILABLE
+            cache.set(cache_key, context, timeout)
+        
+        self._database_context = (version, time.monotonic(), context)
+        return context
+    
+    def _build_database_context(self) -> Optional[str]:
+        """Render the database context, or None if the catalogue could not be read"""
         try:
-            # Get product categories
-            verticals = Vertical.objects.filter(is_active=True).order_by('order')
+            # Get product categories with their active product counts in one query
+            verticals = Vertical.objects.filter(is_active=True).annotate(
+                active_products=Count('product_items', filter=Q(product_items__is_active=True))
+            ).order_by('order')
             categories_text = "\n".join([
-                f"- {v.title}: {v.description[:100]}... ({Product.objects.filter(vertical=v, is_active=True).count()} products)"
+                f"- {v.title}: {v.description[:100]}... ({v.active_products} products)"
                 for v in verticals
             ])
             
@@ -110,7 +185,7 @@ RESPONSE GUIDELINES:
             return context
         except Exception as e:
             logger.error(f"Error getting database context: {e}")
-            return "Error retrieving database context"
+            return None
     
     def get_dynamic_max_tokens(self, message: str) -> int:
         """Dynamically allocate tokens based on query complexity"""
@@ -153,8 +228,40 @@ RESPONSE GUIDELINES:
             else:
                 return 1000
 
-    def generate_ai_response(self, message: str, session_history: List[Dict] = None) -> Dict:
-        """Generate AI response using DeepSeek"""
+    def _build_messages(self, message: str, session_history: List[Dict] = None) -> List[Dict]:
+        """Build the chat completion messages with database context and history"""
+        # Prepare system message with database context
+        system_message = f"""You are a helpful assistant for Westend Corporation, an international food export company based in India.
+
+{self.get_database_context()}
+
+IMPORTANT: 
+- Use the database information provided above
+- Be concise and helpful
+- For typos, try to understand the intent
+- Always prioritize accuracy over creativity
+- If you don't know something, admit it politely
+- For product inquiries, suggest specific categories or ask for clarification
+"""
+        
+        # Prepare messages
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": message}
+        ]
+        
+        # Add recent conversation history if available
+        if session_history:
+            for msg in session_history[-3:]:  # Last 3 messages for context
+                if msg.get('message_type') == 'user':
+                    messages.append({"role": "user", "content": msg.get('content', '')})
+                elif msg.get('message_type') == 'bot':
+                    messages.append({"role": "assistant", "content": msg.get('content', '')})
+        
+        return messages
+    
+    def _check_request_allowed(self, message: str) -> Optional[Dict]:
+        """Return an error result if the AI cannot be called right now"""
         if not self.is_available():
             return {
                 'success': False,
@@ -169,46 +276,64 @@ RESPONSE GUIDELINES:
                 'fallback_response': 'I\'m currently experiencing high demand. Please try again later or contact our support team directly.'
             }
         
-        # Check cache first
+        return None
+    
+    def _get_response_cache_key(self, message: str) -> str:
+        return self.response_cache.make_key(message)
+    
+    def _get_cached_result(self, message: str, count: bool = True) -> Optional[Dict]:
+        """Return a cached AI result for this message, if caching is enabled"""
+        if not self.enable_caching:
+            return None
+        
+        entry = self.response_cache.get(message, count=count)
+        if entry:
+            return {
+                'success': True,
+                'response': entry['response'],
+                'cached': True,
+                'tokens_used': 0
+            }
+        return None
+    
+    def _store_result(self, message: str, ai_response: str, tokens_used: int):
+        """Track usage and cache a completed AI response"""
+        self.track_token_usage(tokens_used)
+        
+        # Smart caching based on query type
         if self.enable_caching:
-            cache_key = f"ai_response_{hash(message.lower())}"
-            cached_response = cache.get(cache_key)
-            if cached_response:
-                return {
-                    'success': True,
-                    'response': cached_response,
-                    'cached': True,
-                    'tokens_used': 0
-                }
+            cache_duration = self._get_cache_duration(message)
+            self.response_cache.set(message, ai_response, tokens_used, cache_duration)
+
+    def generate_ai_response(self, message: str, session_history: List[Dict] = None) -> Dict:
+        """Generate AI response using DeepSeek"""
+        error = self._check_request_allowed(message)
+        if error:
+            return error
         
+        # Check cache first
+        cached_result = self._get_cached_result(message)
+        if cached_result:
+            return cached_result
+        
+        # Identical questions arriving together share a single API call
+        result, shared = self.single_flight.do(
+            self._get_response_cache_key(message),
+            lambda: self._request_completion(message, session_history),
+            lambda: self._get_cached_result(message, count=False)
+        )
+        return self._as_shared_result(result) if shared else result
+    
+    def _as_shared_result(self, result: Dict) -> Dict:
+        """Result handed to callers that waited on someone else's API call"""
+        if not result.get('success'):
+            return result
+        return {**result, 'cached': True, 'coalesced': True, 'tokens_used': 0}
+    
+    def _request_completion(self, message: str, session_history: List[Dict] = None) -> Dict:
+        """Call the API (no cache check) and store the result"""
         try:
-            # Prepare system message with database context
-            system_message = f"""You are a helpful assistant for Westend Corporation, an international food export company based in India.
-
-{self.get_database_context()}
-
-IMPORTANT: 
-- Use the database information provided above
-- Be concise and helpful
-- For typos, try to understand the intent
-- Always prioritize accuracy over creativity
-- If you don't know something, admit it politely
-- For product inquiries, suggest specific categories or ask for clarification
-"""
-            
-            # Prepare messages
-            messages = [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": message}
-            ]
-            
-            # Add recent conversation history if available
-            if session_history:
-                for msg in session_history[-3:]:  # Last 3 messages for context
-                    if msg.get('message_type') == 'user':
-                        messages.append({"role": "user", "content": msg.get('content', '')})
-                    elif msg.get('message_type') == 'bot':
-                        messages.append({"role": "assistant", "content": msg.get('content', '')})
+            messages = self._build_messages(message, session_history)
             
             # Generate response with dynamic tokens
             dynamic_max_tokens = self.get_dynamic_max_tokens(message)
@@ -224,13 +349,7 @@ IMPORTANT:
             ai_response = response.choices[0].message.content
             tokens_used = response.usage.total_tokens
             
-            # Track usage
-            self.track_token_usage(tokens_used)
-            
-            # Smart caching based on query type
-            if self.enable_caching:
-                cache_duration = self._get_cache_duration(message)
-                cache.set(cache_key, ai_response, cache_duration)
+            self._store_result(message, ai_response, tokens_used)
             
             return {
                 'success': True,
@@ -248,6 +367,164 @@ IMPORTANT:
                 'fallback_response': self._get_fallback_response(message)
             }
     
+    def _prepare_request(self, message: str, session_history: List[Dict] = None) -> Tuple[Optional[Dict], List[Dict], int]:
+        """
+        Run all the synchronous (DB and cache) work needed before an AI call.
+        
+        Returns ``(early_result, messages, max_tokens)``; ``early_result`` is set
+        when no API call should be made (unavailable, over limit or cached).
+        """
+        early_result = self._check_request_allowed(message) or self._get_cached_result(message)
+        if early_result:
+            return early_result, [], 0
+        return None, self._build_messages(message, session_history), self.get_dynamic_max_tokens(message)
+    
+    async def agenerate_ai_response(self, message: str, session_history: List[Dict] = None) -> Dict:
+        """Async version of ``generate_ai_response`` for ASGI views"""
+        try:
+            early_result, messages, dynamic_max_tokens = await sync_to_async(self._prepare_request)(message, session_history)
+            if early_result:
+                return early_result
+            
+            result, shared = await self.single_flight.ado(
+                self._get_response_cache_key(message),
+                lambda: self._arequest_completion(message, messages, dynamic_max_tokens),
+                lambda: sync_to_async(self._get_cached_result)(message, count=False)
+            )
+            return self._as_shared_result(result) if shared else result
+            
+        except Exception as e:
+            logger.error(f"DeepSeek async API error: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'fallback_response': self._get_fallback_response(message)
+            }
+    
+    async def _arequest_completion(self, message: str, messages: List[Dict], dynamic_max_tokens: int) -> Dict:
+        """Async API call (no cache check) that stores the result"""
+        try:
+            async with self.async_client() as client:
+                response = await client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=dynamic_max_tokens,
+                    temperature=self.temperature,
+                    stream=False
+                )
+            
+            ai_response = response.choices[0].message.content
+            tokens_used = response.usage.total_tokens
+            
+            await sync_to_async(self._store_result)(message, ai_response, tokens_used)
+            
+            return {
+                'success': True,
+                'response': ai_response,
+                'tokens_used': tokens_used,
+                'dynamic_tokens': dynamic_max_tokens,
+                'cached': False
+            }
+            
+        except Exception as e:
+            logger.error(f"DeepSeek async API error: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'fallback_response': self._get_fallback_response(message)
+            }
+    
+    def stream_ai_response(self, message: str, session_history: List[Dict] = None) -> Iterator[Dict]:
+        """
+        Stream an AI response from DeepSeek.
+        
+        Yields ``{'type': 'token', 'content': ...}`` events as text arrives and a
+        final ``{'type': 'done', 'result': ...}`` event whose result has the same
+        shape as ``generate_ai_response``.
+        """
+        error = self._check_request_allowed(message)
+        if error:
+            yield {'type': 'done', 'result': error}
+            return
+        
+        cached_result = self._get_cached_result(message)
+        if cached_result:
+            yield {'type': 'token', 'content': cached_result['response']}
+            yield {'type': 'done', 'result': cached_result}
+            return
+        
+        # If the same question is already being answered, wait for that answer
+        # rather than paying for a second stream
+        cache_key = self._get_response_cache_key(message)
+        flight = self.single_flight.begin(cache_key)
+        if flight is None:
+            result, shared = self.single_flight.do(
+                cache_key,
+                lambda: self._request_completion(message, session_history),
+                lambda: self._get_cached_result(message, count=False)
+            )
+            result = self._as_shared_result(result) if shared else result
+            if result.get('success'):
+                yield {'type': 'token', 'content': result['response']}
+            yield {'type': 'done', 'result': result}
+            return
+        
+        parts = []
+        result = None
+        try:
+            messages = self._build_messages(message, session_history)
+            dynamic_max_tokens = self.get_dynamic_max_tokens(message)
+            
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=dynamic_max_tokens,
+                temperature=self.temperature,
+                stream=True
+            )
+            
+            tokens_used = 0
+            for chunk in stream:
+                # Providers that report usage send it on the final chunk
+                usage = getattr(chunk, 'usage', None)
+                if usage:
+                    tokens_used = usage.get('total_tokens', 0) if isinstance(usage, dict) else usage.total_tokens
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    parts.append(content)
+                    yield {'type': 'token', 'content': content}
+            
+            ai_response = ''.join(parts)
+            if not tokens_used:
+                # Rough estimate (~4 characters per token) when usage is not reported
+                prompt_chars = sum(len(m['content']) for m in messages)
+                tokens_used = (prompt_chars + len(ai_response)) // 4
+            
+            self._store_result(message, ai_response, tokens_used)
+            
+            result = {
+                'success': True,
+                'response': ai_response,
+                'tokens_used': tokens_used,
+                'dynamic_tokens': dynamic_max_tokens,
+                'cached': False
+            }
+            
+        except Exception as e:
+            logger.error(f"DeepSeek streaming API error: {e}")
+            result = {
+                'success': False,
+                'error': str(e),
+                'partial_response': ''.join(parts),
+                'fallback_response': self._get_fallback_response(message)
+            }
+        finally:
+            self.single_flight.finish(cache_key, flight, result)
+        
+        yield {'type': 'done', 'result': result}
+    
     def _get_cache_duration(self, message: str) -> int:
         """Determine cache duration based on query type"""
         message_lower = message.lower().strip()
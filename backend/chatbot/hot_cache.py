@@ -0,0 +1,79 @@
+"""
+Two-tier cache of hot CachedResponse rows.
+
+Tier 1 is a small per-worker LRU with a TTL, tier 2 is the shared Django
+cache, and misses fall through to the CachedResponse table. Saving or
+deleting a CachedResponse (e.g. in admin) drops its shared entry and bumps a
+version counter that clears every worker's LRU (see signals.py).
+
+Without REDIS_URL the "shared" tier is a per-process LocMem cache, and the
+delete and bump only reach the worker that made the change. Shared entries
+then live at most LOCAL_CACHE_MAX_TIMEOUT seconds (5 minutes), the same
+bound as the LRU, so other workers stop serving an edited answer after that.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from django.conf import settings
+from django.core.cache import cache
+from api.catalogue import bump_version, get_version, versioned_cache_timeout
+
+HOT_QUESTIONS_VERSION_KEY = 'chat_hot_questions_version'
+
+
+class HotQuestionCache:
+    """Bounded LRU of cached chat answers keyed by question hash"""
+
+    def __init__(self):
+        self.max_size = getattr(settings, 'CHAT_HOT_CACHE_SIZE', 256)
+        self.ttl = getattr(settings, 'CHAT_HOT_CACHE_TTL', 300)
+        self.shared_timeout = getattr(settings, 'CHAT_HOT_CACHE_SHARED_TIMEOUT', 60 * 60)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()  # question hash -> (expires at, entry)
+        self._version = None
+
+    def _shared_key(self, question_hash: str) -> str:
+        return f"chat_cached_response_{question_hash}"
+
+    def get(self, question_hash: str) -> Optional[Dict]:
+        version = get_version(HOT_QUESTIONS_VERSION_KEY)
+        now = time.monotonic()
+        with self._lock:
+            if self._version != version:
+                self._entries.clear()
+                self._version = version
+            hit = self._entries.get(question_hash)
+            if hit is not None:
+                if hit[0] > now:
+                    self._entries.move_to_end(question_hash)
+                    return hit[1]
+                del self._entries[question_hash]
+
+        entry = cache.get(self._shared_key(question_hash))
+        if entry is not None:
+            self._remember(question_hash, entry)
+        return entry
+
+    def put(self, question_hash: str, entry: Dict):
+        cache.set(self._shared_key(question_hash), entry, versioned_cache_timeout(self.shared_timeout))
+        self._remember(question_hash, entry)
+
+    def _remember(self, question_hash: str, entry: Dict):
+        with self._lock:
+            self._entries[question_hash] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(question_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, question_hash: str):
+        """Forget one question everywhere"""
+        cache.delete(self._shared_key(question_hash))
+        bump_version(HOT_QUESTIONS_VERSION_KEY)
+        with self._lock:
+            self._entries.pop(question_hash, None)
+
+
+# Global instance, one per worker process
+hot_questions = HotQuestionCache()
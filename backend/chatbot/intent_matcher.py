@@ -0,0 +1,167 @@
+"""
+Precompiled intent matcher for the chatbot.
+
+Active ChatIntents are compiled once per worker into an Aho-Corasick automaton
+for exact keyword hits and a flat keyword table for fuzzy scoring, so intent
+detection needs no database round-trip. The matcher is rebuilt when a
+ChatIntent is saved or deleted (see signals.py).
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from fuzzywuzzy import fuzz
+from api.catalogue import get_version, bump_version
+from .models import ChatIntent
+
+logger = logging.getLogger(__name__)
+
+INTENTS_VERSION_KEY = 'chat_intents_version'
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton reporting every keyword found in a text"""
+
+    def __init__(self, keywords: Dict[str, int]):
+        # keywords maps keyword -> rank (lower rank = higher priority intent)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._best: List[Optional[int]] = [None]
+
+        for keyword, rank in keywords.items():
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._best[state] = rank if self._best[state] is None else min(self._best[state], rank)
+
+        # Breadth-first pass to fill failure links, folding output ranks along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                inherited = self._best[self._fail[child]]
+                if inherited is not None and (self._best[child] is None or inherited < self._best[child]):
+                    self._best[child] = inherited
+
+    def best_rank(self, text: str) -> Optional[int]:
+        """Lowest rank among all keywords occurring anywhere in ``text``"""
+        best = None
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            rank = self._best[state]
+            if rank is not None and (best is None or rank < best):
+                best = rank
+                if best == 0:
+                    break
+        return best
+
+
+class IntentMatcher:
+    """Compiled view of the active ChatIntents"""
+
+    def __init__(self):
+        self.similarity_threshold = 75
+        self.max_age = getattr(settings, 'CHAT_INTENT_MATCHER_MAX_AGE', 300)
+        self.fuzzy_cache_size = getattr(settings, 'CHAT_INTENT_FUZZY_CACHE_SIZE', 2048)
+        self._lock = threading.Lock()
+        # (intent names by rank, exact automaton, fuzzy keyword table), swapped atomically
+        self._compiled: Optional[Tuple[List[str], KeywordAutomaton, List[Tuple[str, int]]]] = None
+        self._fuzzy_cache: OrderedDict = OrderedDict()
+        self._version = None
+        self._built_at = 0.0
+
+    def build(self):
+        """Compile the active intents from the database"""
+        version = get_version(INTENTS_VERSION_KEY)
+        intents = ChatIntent.objects.filter(is_active=True).order_by('-priority')
+
+        names = []
+        exact_keywords: Dict[str, int] = {}
+        fuzzy_table = []
+        for rank, intent in enumerate(intents):
+            names.append(intent.name)
+            for keyword in intent.keywords.split(','):
+                keyword = keyword.strip().lower()
+                if not keyword:
+                    continue
+                exact_keywords.setdefault(keyword, rank)
+                fuzzy_table.append((keyword, rank))
+
+        with self._lock:
+            self._compiled = (names, KeywordAutomaton(exact_keywords), fuzzy_table)
+            self._fuzzy_cache = OrderedDict()
+            self._version = version
+            self._built_at = time.monotonic()
+
+        logger.info(f"Intent matcher compiled {len(exact_keywords)} keywords from {len(names)} intents")
+
+    def ensure_fresh(self):
+        if (
+            self._compiled is None
+            or self._version != get_version(INTENTS_VERSION_KEY)
+            or time.monotonic() - self._built_at > self.max_age
+        ):
+            self.build()
+
+    def invalidate(self):
+        """Force a rebuild in every worker on their next message"""
+        bump_version(INTENTS_VERSION_KEY)
+        with self._lock:
+            self._compiled = None
+
+    def _fuzzy_match(self, normalized_message: str, names: List[str], table: List[Tuple[str, int]]) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            if normalized_message in self._fuzzy_cache:
+                self._fuzzy_cache.move_to_end(normalized_message)
+                return self._fuzzy_cache[normalized_message]
+
+        best_rank = None
+        best_score = 0
+        for keyword, rank in table:
+            score = fuzz.partial_ratio(keyword, normalized_message)
+            # Strict comparison keeps the higher-priority intent on ties
+            if score > self.similarity_threshold and score > best_score:
+                best_rank = rank
+                best_score = score
+        result = (names[best_rank], best_score / 100.0) if best_rank is not None else None
+
+        with self._lock:
+            self._fuzzy_cache[normalized_message] = result
+            if len(self._fuzzy_cache) > self.fuzzy_cache_size:
+                self._fuzzy_cache.popitem(last=False)
+        return result
+
+    def match(self, normalized_message: str) -> Optional[Tuple[str, float]]:
+        """Return (intent name, confidence) for an already normalized message"""
+        self.ensure_fresh()
+
+        compiled = self._compiled
+        if compiled is None:
+            return None
+        names, automaton, table = compiled
+
+        rank = automaton.best_rank(normalized_message)
+        if rank is not None:
+            return names[rank], 0.9  # High confidence for exact match
+
+        return self._fuzzy_match(normalized_message, names, table)
+
+
+# Global instance, one per worker process
+intent_matcher = IntentMatcher()
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_default_intents'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -28,6 +28,10 @@ class ChatSession(models.Model):
     def update_activity(self):
         self.last_activity = timezone.now()
         self.save(update_fields=['last_activity'])
+    
+    async def aupdate_activity(self):
+        self.last_activity = timezone.now()
+        await self.asave(update_fields=['last_activity'])
 
 
 class ChatMessage(models.Model):
@@ -50,7 +54,8 @@ class ChatMessage(models.Model):
     # Response data (for structured responses)
     response_data = models.JSONField(default=dict, blank=True)
     
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the message is created, not when the write-behind buffer flushes it
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['timestamp']
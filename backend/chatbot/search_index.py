@@ -0,0 +1,247 @@
+"""
+In-memory product search index for the chatbot.
+
+Built once per worker from the public catalogue and kept up to date
+incrementally from Product signals. Candidate lookup goes through token and
+trigram postings so fuzzy scoring only runs on a small shortlist instead of
+every product name.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+from django.conf import settings
+from fuzzywuzzy import fuzz, process
+from api.catalogue import get_catalogue_version
+from api.models import Product, Vertical
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, collapse whitespace and strip punctuation"""
+    text = re.sub(r'\s+', ' ', text.lower().strip())
+    return re.sub(r'[^\w\s]', '', text)
+
+
+def trigrams(text: str) -> Set[str]:
+    """Unpadded character trigrams, used for substring candidates"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def token_trigrams(tokens: List[str]) -> Set[str]:
+    """Space-padded trigrams per token, used for fuzzy candidates"""
+    grams = set()
+    for token in tokens:
+        grams |= trigrams(f" {token} ")
+    return grams
+
+
+class ProductSearchIndex:
+    """Per-worker search index over public products"""
+
+    def __init__(self):
+        self.max_age = getattr(settings, 'CHAT_SEARCH_INDEX_MAX_AGE', 300)
+        self.shortlist_size = getattr(settings, 'CHAT_SEARCH_SHORTLIST_SIZE', 50)
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._entries: Dict[int, Dict] = {}
+        self._token_postings: Dict[str, Set[int]] = defaultdict(set)
+        self._trigram_postings: Dict[str, Set[int]] = defaultdict(set)
+        self._vertical_products: Dict[int, Set[int]] = defaultdict(set)
+        self._verticals: List[Tuple[int, str, List[str]]] = []
+        self._version = None
+        self._built_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def build(self):
+        """Rebuild the whole index from the database"""
+        version = get_catalogue_version()
+        products = Product.objects.filter(is_active=True, is_public=True).select_related('vertical')
+        verticals = Vertical.objects.filter(is_active=True).order_by('order')
+
+        with self._lock:
+            self._reset()
+            for product in products:
+                self._add(product)
+            self._verticals = [(v.id, v.title, v.title.lower().split()) for v in verticals]
+            self._version = version
+            self._built_at = time.monotonic()
+
+        logger.info(f"Product search index built with {len(self._entries)} products")
+
+    def ensure_fresh(self):
+        """Rebuild if the catalogue version moved on or the index is too old"""
+        if (
+            self._version is None
+            or self._version != get_catalogue_version()
+            or time.monotonic() - self._built_at > self.max_age
+        ):
+            self.build()
+
+    def upsert(self, product: Product):
+        """Apply a single product change without rebuilding"""
+        with self._lock:
+            if self._version is None:
+                return  # Not built yet, the first search will load everything
+            self._remove(product.id)
+            if product.is_active and product.is_public:
+                self._add(product)
+            self._version = get_catalogue_version()
+
+    def remove(self, product_id: int):
+        with self._lock:
+            if self._version is None:
+                return
+            self._remove(product_id)
+            self._version = get_catalogue_version()
+
+    def _add(self, product: Product):
+        name_lower = product.name.lower()
+        tokens = normalize_text(product.name).split()
+        grams = trigrams(name_lower) | token_trigrams(tokens)
+        description = product.description or ''
+
+        self._entries[product.id] = {
+            'name': product.name,
+            'name_lower': name_lower,
+            'tokens': tokens,
+            'trigrams': grams,
+            'vertical_id': product.vertical_id,
+            'sort_key': (product.order, -(product.created_at.timestamp() if product.created_at else 0)),
+            'data': {
+                'id': product.id,
+                'name': product.name,
+                'slug': product.slug,
+                'description': description[:200] + '...' if len(description) > 200 else description,
+                'image': product.image.url if product.image else None,
+                'badge': product.badge,
+                'stock_status': product.stock_status,
+                'moq': product.moq,
+                'packaging': product.packaging,
+                'vertical': product.vertical.title,
+            },
+        }
+        for token in tokens:
+            self._token_postings[token].add(product.id)
+        for gram in grams:
+            self._trigram_postings[gram].add(product.id)
+        self._vertical_products[product.vertical_id].add(product.id)
+
+    def _remove(self, product_id: int):
+        entry = self._entries.pop(product_id, None)
+        if not entry:
+            return
+        for token in entry['tokens']:
+            postings = self._token_postings.get(token)
+            if postings is not None:
+                postings.discard(product_id)
+                if not postings:
+                    del self._token_postings[token]
+        for gram in entry['trigrams']:
+            postings = self._trigram_postings.get(gram)
+            if postings is not None:
+                postings.discard(product_id)
+                if not postings:
+                    del self._trigram_postings[gram]
+        self._vertical_products[entry['vertical_id']].discard(product_id)
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def _substring_candidates(self, word: str) -> Set[int]:
+        """Products whose name contains ``word`` (verified, not just trigram hits)"""
+        grams = trigrams(word)
+        if not grams:
+            return set()
+        postings = [self._trigram_postings.get(g, set()) for g in grams]
+        postings.sort(key=len)
+        ids = set(postings[0])
+        for p in postings[1:]:
+            ids &= p
+            if not ids:
+                break
+        return {pid for pid in ids if word in self._entries[pid]['name_lower']}
+
+    def _shortlist(self, words: List[str]) -> Dict[str, int]:
+        """Best candidates by shared trigrams/tokens, as a name -> id map"""
+        overlap: Dict[int, int] = defaultdict(int)
+        for gram in token_trigrams(words):
+            for pid in self._trigram_postings.get(gram, ()):
+                overlap[pid] += 1
+        for word in words:
+            for pid in self._token_postings.get(word, ()):
+                overlap[pid] += 3  # Whole-token hits outweigh partial overlap
+
+        best = sorted(overlap.items(), key=lambda item: item[1], reverse=True)[:self.shortlist_size]
+        return {self._entries[pid]['name']: pid for pid, _ in best}
+
+    def search(self, query: str, limit: int = 10, threshold: int = 75) -> List[Dict]:
+        """Rank products for ``query`` using the same strategies as the old full scan"""
+        self.ensure_fresh()
+
+        query_lower = query.lower()
+        query_words = query_lower.split()
+
+        with self._lock:
+            shortlist = self._shortlist(normalize_text(query).split())
+            names = list(shortlist.keys())
+            all_results: List[Tuple[str, int, str, int]] = []
+
+            # Strategy 1: fuzzy match of the full query
+            if names:
+                for name, score in process.extract(query_lower, names, limit=limit, scorer=fuzz.ratio):
+                    all_results.append((name, score, 'full_query', shortlist[name]))
+
+            # Strategy 2: individual keywords, word order insensitive
+            for word in query_words:
+                if len(word) > 3 and names:
+                    for name, score in process.extract(word, names, limit=limit // 2, scorer=fuzz.token_sort_ratio):
+                        all_results.append((name, score, f'keyword_{word}', shortlist[name]))
+
+            # Strategy 3: exact substring matches get a fixed boost
+            for word in query_words:
+                if len(word) > 2:
+                    for pid in self._substring_candidates(word):
+                        all_results.append((self._entries[pid]['name'], 90, f'exact_{word}', pid))
+
+            # Strategy 4: query mentions a vertical, suggest its first products
+            for vertical_id, title, vertical_words in self._verticals:
+                if any(v_word in query_lower and len(v_word) > 3 for v_word in vertical_words):
+                    ids = sorted(
+                        self._vertical_products.get(vertical_id, ()),
+                        key=lambda pid: self._entries[pid]['sort_key']
+                    )[:5]
+                    for pid in ids:
+                        all_results.append((self._entries[pid]['name'], 85, f'vertical_{title.lower()}', pid))
+
+            # Deduplicate by name keeping the best score
+            unique_results = {}
+            for name, score, method, pid in all_results:
+                if name not in unique_results or score > unique_results[name][1]:
+                    unique_results[name] = (name, score, method, pid)
+
+            sorted_results = sorted(unique_results.values(), key=lambda x: x[1], reverse=True)[:limit]
+
+            formatted_results = []
+            for name, score, method, pid in sorted_results:
+                if score >= threshold:
+                    formatted_results.append({
+                        **self._entries[pid]['data'],
+                        'match_score': score,
+                        'match_method': method
+                    })
+            return formatted_results
+
+
+# Global instance, one per worker process
+product_index = ProductSearchIndex()
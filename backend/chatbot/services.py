@@ -1,12 +1,20 @@
 import hashlib
+import logging
 import re
 import json
 from typing import Dict, List, Optional, Tuple
 from django.core.cache import cache
-from django.db.models import Q
+from django.db.models import Count, Q
 from fuzzywuzzy import fuzz, process
-from api.models import Product, CompanyInfo, Vertical
+from api.models import CompanyInfo, Vertical
+from api.catalogue import get_catalogue_version, versioned_cache_timeout
 from .models import ChatIntent, CachedResponse
+from .search_index import product_index, normalize_text
+from .intent_matcher import intent_matcher
+from .write_behind import chat_writes
+from .hot_cache import hot_questions
+
+logger = logging.getLogger(__name__)
 
 
 class CostOptimizedChatbot:
@@ -22,137 +30,58 @@ class CostOptimizedChatbot:
     
     def normalize_text(self, text: str) -> str:
         """Normalize text for better matching"""
-        # Remove extra whitespace, convert to lowercase
-        text = re.sub(r'\s+', ' ', text.lower().strip())
-        # Remove common punctuation
-        text = re.sub(r'[^\w\s]', '', text)
-        return text
+        return normalize_text(text)
     
     def check_cached_response(self, question: str) -> Optional[Dict]:
         """Check if we have a cached response for this question"""
         question_hash = self.get_question_hash(question)
-        cached = CachedResponse.objects.filter(question_hash=question_hash).first()
         
-        if cached:
-            # Update usage count
-            CachedResponse.objects.filter(id=cached.id).update(usage_count=cached.usage_count + 1)
-            return {
-                'type': 'cached',
+        # Popular questions are answered from memory without touching the DB
+        entry = hot_questions.get(question_hash)
+        if entry is None:
+            cached = CachedResponse.objects.filter(question_hash=question_hash).first()
+            if not cached:
+                return None
+            entry = {
+                'id': cached.id,
                 'response': cached.response,
                 'response_data': cached.response_data,
                 'intent': cached.intent,
                 'confidence': cached.confidence,
-                'source': 'cache'
             }
-        return None
+            hot_questions.put(question_hash, entry)
+        
+        # Counted in memory and folded into usage_count in batches
+        chat_writes.record_cache_hit(entry['id'])
+        return {
+            'type': 'cached',
+            'response': entry['response'],
+            'response_data': entry['response_data'],
+            'intent': entry['intent'],
+            'confidence': entry['confidence'],
+            'source': 'cache'
+        }
     
     def detect_intent_locally(self, message: str) -> Optional[Tuple[str, float]]:
         """Detect intent using local pattern matching (no AI API call)"""
-        normalized_message = self.normalize_text(message)
-        
-        # Get active intents ordered by priority
-        intents = ChatIntent.objects.filter(is_active=True).order_by('-priority')
-        
-        best_intent = None
-        best_score = 0
-        
-        for intent in intents:
-            keywords = [kw.strip().lower() for kw in intent.keywords.split(',')]
-            
-            # Check for exact keyword matches
-            for keyword in keywords:
-                if keyword in normalized_message:
-                    return intent.name, 0.9  # High confidence for exact match
-            
-            # Check fuzzy matching
-            for keyword in keywords:
-                score = fuzz.partial_ratio(keyword, normalized_message)
-                if score > self.similarity_threshold and score > best_score:
-                    best_intent = intent.name
-                    best_score = score / 100.0
-        
-        return (best_intent, best_score) if best_intent else None
+        # Compiled per worker from active ChatIntents, no DB round-trip
+        return intent_matcher.match(self.normalize_text(message))
     
     def search_products_locally(self, query: str, limit: int = 10) -> List[Dict]:
         """Search products using fuzzy matching (no AI API call)"""
         # Try cache first
-        cache_key = f"chat_products_{hashlib.md5(query.lower().encode()).hexdigest()}"
+        cache_key = f"chat_products_{get_catalogue_version()}_{hashlib.md5(query.lower().encode()).hexdigest()}"
         cached_result = cache.get(cache_key)
         
         if cached_result:
             return cached_result
         
-        # Get all active products
-        products = Product.objects.filter(is_active=True, is_public=True)
-        product_names = {p.name: p for p in products}
-        
-        # Extract keywords from query for better matching
-        query_words = query.lower().split()
+        # Candidate lookup and scoring go through the per-worker index
+        formatted_results = product_index.search(query, limit=limit, threshold=self.similarity_threshold)
         
-        # Try different search strategies with improved accuracy
-        all_results = []
-        
-        # Strategy 1: Direct fuzzy search on full query with higher threshold
-        results = process.extract(query.lower(), list(product_names.keys()), limit=limit, scorer=fuzz.ratio)
-        all_results.extend([(name, score, 'full_query') for name, score in results])
-        
-        # Strategy 2: Search individual keywords with strict matching
-        for word in query_words:
-            if len(word) > 3:  # Only match words longer than 3 characters
-                # Use token sort ratio for better word order matching
-                word_results = process.extract(word, list(product_names.keys()), limit=limit//2, scorer=fuzz.token_sort_ratio)
-                all_results.extend([(name, score, f'keyword_{word}') for name, score in word_results])
-        
-        # Strategy 3: Exact word matching for high confidence
-        for word in query_words:
-            if len(word) > 2:
-                for product_name in product_names.keys():
-                    if word in product_name.lower():
-                        # Boost score for exact word matches
-                        all_results.append((product_name, 90, f'exact_{word}'))
-        
-        # Strategy 4: Search vertical names with higher confidence
-        verticals = Vertical.objects.filter(is_active=True)
-        for vertical in verticals:
-            vertical_words = vertical.title.lower().split()
-            for v_word in vertical_words:
-                if v_word in query.lower() and len(v_word) > 3:
-                    # Get products from this vertical
-                    vertical_products = Product.objects.filter(vertical=vertical, is_active=True, is_public=True)[:5]
-                    for product in vertical_products:
-                        all_results.append((product.name, 85, f'vertical_{vertical.title.lower()}'))
-        
-        # Remove duplicates and sort by score
-        unique_results = {}
-        for name, score, method in all_results:
-            if name not in unique_results or score > unique_results[name][1]:
-                unique_results[name] = (name, score, method)
-        
-        # Sort by score and take top results
-        sorted_results = sorted(unique_results.values(), key=lambda x: x[1], reverse=True)[:limit]
-        
-        # Format results
-        formatted_results = []
-        for name, score, method in sorted_results:
-            if score >= self.similarity_threshold:
-                product = product_names[name]
-                formatted_results.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'slug': product.slug,
-                    'description': product.description[:200] + '...' if len(product.description) > 200 else product.description,
-                    'image': product.image.url if product.image else None,
-                    'badge': product.badge,
-                    'stock_status': product.stock_status,
-                    'moq': product.moq,
-                    'packaging': product.packaging,
-                    'vertical': product.vertical.title,
-                    'match_score': score,
-                    'match_method': method
-                })
-        
-        # Cache results for 1 hour
-        cache.set(cache_key, formatted_results, 60 * 60)
+        # Cache results for 1 hour (capped with a per-process cache, where
+        # other workers never see the catalogue version bump)
+        cache.set(cache_key, formatted_results, versioned_cache_timeout(60 * 60))
         return formatted_results
     
     def should_use_ai(self, message: str, intent: str = None) -> bool:
@@ -218,6 +147,14 @@ class CostOptimizedChatbot:
         cache.set(cache_key, info, 60 * 60 * 6)
         return info
     
+    def get_verticals_with_counts(self) -> List[Vertical]:
+        """Active verticals with their active product counts, in one query"""
+        return list(
+            Vertical.objects.filter(is_active=True).annotate(
+                product_count=Count('product_items', filter=Q(product_items__is_active=True))
+            ).order_by('order')
+        )
+    
     def generate_template_response(self, intent: str, context: Dict = None) -> Dict:
         """Generate response from template (no AI API call)"""
         try:
@@ -251,10 +188,8 @@ class CostOptimizedChatbot:
                         # Show categories first for general inquiries
                         response = "I'd be happy to help you find products! We offer 8 main categories:\n\n"
                         
-                        verticals = Vertical.objects.filter(is_active=True).order_by('order')
-                        for i, v in enumerate(verticals, 1):
-                            product_count = Product.objects.filter(vertical=v, is_active=True).count()
-                            response += f"{i}. {v.title} ({product_count} items)\n"
+                        for i, v in enumerate(self.get_verticals_with_counts(), 1):
+                            response += f"{i}. {v.title} ({v.product_count} items)\n"
                             response += f"   {v.description[:80]}...\n\n"
                         
                         response += "Which category interests you most?\n"
@@ -309,10 +244,9 @@ class CostOptimizedChatbot:
                     response = "I couldn't find exact matches. Let me help you:\n\n"
                     response += "Browse Our Categories:\n"
                     
-                    verticals = Vertical.objects.filter(is_active=True).order_by('order')
+                    verticals = self.get_verticals_with_counts()
                     for v in verticals[:4]:  # Show only top 4 categories
-                        product_count = Product.objects.filter(vertical=v, is_active=True).count()
-                        response += f"- {v.title} ({product_count} items)\n"
+                        response += f"- {v.title} ({v.product_count} items)\n"
                     
                     response += f"\nAnd {len(verticals) - 4} more categories...\n\n"
                     response += "Try:\n"
@@ -351,10 +285,8 @@ class CostOptimizedChatbot:
             if intent == 'categories':
                 response = "We have 8 main product categories:\n\n"
                 
-                verticals = Vertical.objects.filter(is_active=True).order_by('order')
-                for v in verticals:
-                    product_count = Product.objects.filter(vertical=v, is_active=True).count()
-                    response += f"- {v.title}: {v.description[:80]}... ({product_count} items)\n"
+                for v in self.get_verticals_with_counts():
+                    response += f"- {v.title}: {v.description[:80]}... ({v.product_count} items)\n"
                 
                 response += "\nWhich category would you like to explore?"
                 
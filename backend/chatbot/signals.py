@@ -0,0 +1,48 @@
+"""
+Keep the chatbot's in-memory indexes and caches in sync with database changes
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from api.models import Product
+from .models import ChatIntent, CachedResponse
+from .search_index import product_index
+from .intent_matcher import intent_matcher
+from .hot_cache import hot_questions
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    """Apply the change to this worker's product index"""
+    try:
+        product_index.upsert(instance)
+    except Exception as e:
+        logger.error(f"Failed to update product search index: {e}")
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    """Drop the product from this worker's product index"""
+    try:
+        product_index.remove(instance.pk)
+    except Exception as e:
+        logger.error(f"Failed to update product search index: {e}")
+
+
+@receiver(post_save, sender=ChatIntent)
+@receiver(post_delete, sender=ChatIntent)
+def chat_intent_changed(sender, instance, **kwargs):
+    """Recompile the intent matcher in every worker"""
+    intent_matcher.invalidate()
+
+
+@receiver(post_save, sender=CachedResponse)
+@receiver(post_delete, sender=CachedResponse)
+def cached_response_changed(sender, instance, **kwargs):
+    """Stop serving the old answer from the hot-question cache"""
+    try:
+        hot_questions.invalidate(instance.question_hash)
+    except Exception as e:
+        logger.error(f"Failed to invalidate hot-question cache: {e}")
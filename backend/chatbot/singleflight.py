@@ -0,0 +1,159 @@
+"""
+Request coalescing ("single-flight") for expensive calls.
+
+Concurrent callers asking for the same key share one in-flight computation.
+Within a worker, threads (or coroutines) wait on the leader directly. Across
+workers, a short-lived lock in the Django cache marks the key as in flight
+and followers poll a lookup function (normally the response cache) until the
+leader has published its result.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from django.core.cache import cache
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key"""
+
+    def __init__(self, lock_timeout: int = 30, wait_timeout: float = 30.0, poll_interval: float = 0.1):
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Tuple[int, str], asyncio.Future] = {}
+
+    def _lock_key(self, key: str) -> str:
+        return f"{key}_inflight"
+
+    def begin(self, key: str) -> Optional[_Call]:
+        """Become the leader for ``key``, or return None if a flight is already running"""
+        with self._lock:
+            if key in self._calls:
+                return None
+            call = _Call()
+            self._calls[key] = call
+
+        if not cache.add(self._lock_key(key), 1, self.lock_timeout):
+            # Another worker is already computing this key
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+            return None
+        return call
+
+    def finish(self, key: str, call: _Call, result: Any):
+        """Publish the leader's result and release the key"""
+        call.result = result
+        with self._lock:
+            self._calls.pop(key, None)
+        cache.delete(self._lock_key(key))
+        call.event.set()
+
+    def wait(self, key: str, lookup: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Wait for an in-flight call on ``key`` and return its result.
+
+        Returns None when the flight ended without a shareable result or the
+        wait timed out; the caller should then compute the value itself.
+        """
+        deadline = time.monotonic() + (self.wait_timeout if timeout is None else timeout)
+
+        with self._lock:
+            call = self._calls.get(key)
+        if call is not None:
+            call.event.wait(max(0.0, deadline - time.monotonic()))
+            return call.result
+
+        while time.monotonic() < deadline:
+            found = lookup()
+            if found is not None:
+                return found
+            if cache.get(self._lock_key(key)) is None:
+                # Leader finished (or died) without publishing; last look before giving up
+                return lookup()
+            time.sleep(self.poll_interval)
+        return None
+
+    def do(self, key: str, fn: Callable[[], Any], lookup: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run ``fn`` once for all concurrent callers of ``key``.
+
+        Returns ``(result, shared)`` where ``shared`` is True when the result
+        came from another caller's call.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            call = self.begin(key)
+            if call is not None:
+                result = None
+                try:
+                    # The previous leader may have finished between our miss and now
+                    found = lookup()
+                    if found is not None:
+                        result = found
+                        return found, True
+                    result = fn()
+                    return result, False
+                finally:
+                    self.finish(key, call, result)
+
+            result = self.wait(key, lookup, timeout=max(0.0, deadline - time.monotonic()))
+            if result is not None:
+                return result, True
+            if time.monotonic() >= deadline:
+                return fn(), False
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]], lookup: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async version of ``do`` for coroutines sharing an event loop"""
+        loop = asyncio.get_running_loop()
+        local_key = (id(loop), key)
+
+        pending = self._async_calls.get(local_key)
+        if pending is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(pending), self.wait_timeout)
+                if result is not None:
+                    return result, True
+            except asyncio.TimeoutError:
+                pass
+            return await fn(), False
+
+        future = loop.create_future()
+        self._async_calls[local_key] = future
+        result = None
+        try:
+            deadline = time.monotonic() + self.wait_timeout
+            while True:
+                acquired = await cache.aadd(self._lock_key(key), 1, self.lock_timeout)
+                if acquired:
+                    try:
+                        result = await lookup()
+                        if result is not None:
+                            return result, True
+                        result = await fn()
+                        return result, False
+                    finally:
+                        await cache.adelete(self._lock_key(key))
+
+                # Another worker is computing, poll for its published result
+                result = await lookup()
+                if result is not None:
+                    return result, True
+                if time.monotonic() >= deadline:
+                    result = await fn()
+                    return result, False
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            self._async_calls.pop(local_key, None)
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,498 @@
+import asyncio
+import atexit
+import json
+import random
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache as django_cache
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.catalogue import get_catalogue_version
+from api.models import Vertical
+
+from .ai_cache import HITS_KEY, MISSES_KEY, TOKENS_SAVED_KEY, AIResponseCache
+from .deepseek_ai import DATABASE_CONTEXT_UNAVAILABLE, DeepSeekAIService
+from .hot_cache import HotQuestionCache
+from .intent_matcher import IntentMatcher, KeywordAutomaton
+from .models import CachedResponse, ChatIntent, ChatMessage, ChatSession
+from .services import CostOptimizedChatbot
+from .singleflight import SingleFlight
+from .write_behind import ChatWriteBuffer
+
+
+class ChatStreamTests(TestCase):
+    """The streaming endpoint must accept the headers the chat widget sends"""
+
+    def setUp(self):
+        with override_settings(CHAT_WRITE_BEHIND=False):
+            buffer = ChatWriteBuffer()
+        for target in ['chatbot.views.chat_writes', 'chatbot.services.chat_writes']:
+            patcher = mock.patch(target, buffer)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.session = ChatSession.objects.create()
+
+    def post(self, body):
+        # Same headers as chatbotService.sendMessageStream
+        return self.client.post(
+            '/api/chat/message/stream/', json.dumps(body), content_type='application/json',
+            HTTP_ACCEPT='text/event-stream', HTTP_CACHE_CONTROL='no-cache',
+        )
+
+    def test_widget_accept_header_gets_a_stream(self):
+        question = 'What are your payment terms?'
+        CachedResponse.objects.create(
+            question_hash=CostOptimizedChatbot().get_question_hash(question),
+            question=question, response='30 days net.', intent='payment', confidence=1.0,
+        )
+
+        response = self.post({'session_id': str(self.session.session_id), 'message': question})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('event: token', body)
+        self.assertIn('event: done', body)
+        self.assertEqual(
+            list(ChatMessage.objects.filter(session=self.session).values_list('message_type', flat=True).order_by('id')),
+            ['user', 'bot']
+        )
+
+    def test_errors_are_json_not_406(self):
+        response = self.post({'session_id': 'missing', 'message': 'hello'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'Invalid session'})
+
+        self.assertEqual(self.client.get('/api/chat/message/stream/').status_code, 405)
+
+
+class ChatWriteBufferFlushTests(TransactionTestCase):
+    """A row the database rejects must not block the rest of the buffer"""
+
+    def setUp(self):
+        # No background thread: the test flushes explicitly
+        patcher = mock.patch.object(ChatWriteBuffer, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with override_settings(CHAT_WRITE_BEHIND=True):
+            self.buffer = ChatWriteBuffer()
+
+    def test_message_for_deleted_session_is_dropped_alone(self):
+        kept = ChatSession.objects.create()
+        deleted = ChatSession.objects.create()
+        self.buffer.add_message(session=kept, message_type='user', content='first')
+        self.buffer.add_message(session=deleted, message_type='user', content='orphan')
+        self.buffer.add_message(session=kept, message_type='bot', content='second')
+        self.buffer.touch_session(deleted)
+        # Deleted elsewhere (e.g. in the admin) while its message waited
+        ChatSession.objects.filter(pk=deleted.pk).delete()
+
+        with self.assertLogs('chatbot.write_behind', 'ERROR') as logs:
+            self.buffer.flush()
+        self.assertIn("'orphan'", '\n'.join(logs.output))
+        self.assertEqual(
+            list(ChatMessage.objects.values_list('content', flat=True).order_by('timestamp')),
+            ['first', 'second']
+        )
+        self.assertEqual(self.buffer._messages, [])
+
+        # Later flushes are unaffected
+        self.buffer.add_message(session=kept, message_type='user', content='third')
+        self.buffer.flush()
+        self.assertEqual(ChatMessage.objects.filter(session=kept).count(), 3)
+
+
+class ChatWriteBufferTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(ChatWriteBuffer, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with override_settings(CHAT_WRITE_BEHIND=True):
+            self.buffer = ChatWriteBuffer()
+        # Unflushed messages must not be written at exit, after the test database is gone
+        self.addCleanup(atexit.unregister, self.buffer.flush)
+        self.session = ChatSession.objects.create()
+
+    def cached_response(self, question, usage_count=0):
+        return CachedResponse.objects.create(
+            question_hash=CostOptimizedChatbot().get_question_hash(question),
+            question=question, response='...', intent='faq', confidence=1.0, usage_count=usage_count,
+        )
+
+    def test_cache_hits_fold_into_one_update_per_increment(self):
+        popular = self.cached_response('What is the MOQ?', usage_count=5)
+        also_popular = self.cached_response('Do you export?', usage_count=1)
+        rare = self.cached_response('Are you ISO certified?')
+        for _ in range(3):
+            self.buffer.record_cache_hit(popular.pk)
+            self.buffer.record_cache_hit(also_popular.pk)
+        self.buffer.record_cache_hit(rare.pk)
+        # Another worker counts its own hits between our hit and our flush
+        CachedResponse.objects.filter(pk=popular.pk).update(usage_count=100)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.buffer.flush()
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            dict(CachedResponse.objects.values_list('question', 'usage_count')),
+            {'What is the MOQ?': 103, 'Do you export?': 4, 'Are you ISO certified?': 1}
+        )
+
+        # Counted hits are not applied twice
+        self.buffer.flush()
+        self.assertEqual(CachedResponse.objects.get(pk=rare.pk).usage_count, 1)
+
+    def test_cache_hit_written_immediately_when_disabled(self):
+        with override_settings(CHAT_WRITE_BEHIND=False):
+            buffer = ChatWriteBuffer()
+        cached = self.cached_response('What is the MOQ?')
+        buffer.record_cache_hit(cached.pk)
+        self.assertEqual(CachedResponse.objects.get(pk=cached.pk).usage_count, 1)
+
+    def test_merge_pending_adds_unflushed_messages_in_order(self):
+        ChatMessage.objects.create(session=self.session, message_type='user', content='stored')
+        self.buffer.add_message(session=self.session, message_type='bot', content='pending reply')
+        self.buffer.add_message(session=ChatSession.objects.create(), message_type='user', content='elsewhere')
+        self.buffer.add_message(session=self.session, message_type='user', content='pending question')
+
+        stored = list(self.session.messages.order_by('timestamp'))
+        merged = self.buffer.merge_pending(self.session, stored)
+        self.assertEqual([m.content for m in merged], ['stored', 'pending reply', 'pending question'])
+        merged = self.buffer.merge_pending(self.session, stored, limit=2)
+        self.assertEqual([m.content for m in merged], ['pending reply', 'pending question'])
+
+    def test_merge_pending_skips_messages_already_read_back(self):
+        self.buffer.add_message(session=self.session, message_type='user', content='question')
+        self.buffer.add_message(session=self.session, message_type='bot', content='answer')
+        # A read between the flush's insert and the end of the flush sees
+        # the rows in the database and in the in-flight list
+        self.buffer._in_flight, self.buffer._messages = self.buffer._messages, []
+        ChatMessage.objects.bulk_create(self.buffer._in_flight)
+
+        stored = list(self.session.messages.order_by('timestamp'))
+        merged = self.buffer.merge_pending(self.session, stored)
+        self.assertEqual([m.content for m in merged], ['question', 'answer'])
+
+
+class ChatProductSearchCacheTests(TestCase):
+    def test_results_expire_with_local_cache(self):
+        # Other LocMem workers never see the catalogue version bump
+        with mock.patch('chatbot.services.cache') as cache, \
+                mock.patch('chatbot.services.product_index.search', return_value=[]):
+            cache.get.return_value = None
+            CostOptimizedChatbot().search_products_locally('basmati rice')
+        self.assertEqual(cache.set.call_args.args[2], 300)
+
+
+class AICacheStatsTests(TestCase):
+    def test_counters_are_visible_to_staff(self):
+        cache = AIResponseCache('deepseek-chat', 0.7)
+        cache.set('What is the MOQ?', 'One pallet.', 120, 60)
+        with mock.patch('chatbot.views.deepseek_service.response_cache', cache):
+            django_cache.delete_many([HITS_KEY, MISSES_KEY, TOKENS_SAVED_KEY])
+            cache.get('what is the moq')
+            cache.get('Do you ship to Dubai?')
+
+            self.assertEqual(self.client.get('/api/chat/stats/ai-cache/').status_code, 302)
+            staff = User.objects.create_user('staff', password='pw', is_staff=True)
+            self.client.force_login(staff)
+            response = self.client.get('/api/chat/stats/ai-cache/')
+        self.assertEqual(response.json(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'tokens_saved': 120})
+
+
+class AsyncClientTests(SimpleTestCase):
+    """AsyncOpenAI connection pools must not outlive their event loop"""
+
+    async def use_client(self, service, times=1):
+        clients = []
+        for _ in range(times):
+            async with service.async_client() as client:
+                clients.append(client)
+        return clients
+
+    def test_one_off_loops_close_their_client(self):
+        # What WSGI does: every async view runs in a new loop
+        service = DeepSeekAIService()
+        first, = asyncio.run(self.use_client(service))
+        second, = asyncio.run(self.use_client(service))
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed())
+        self.assertTrue(second.is_closed())
+
+    def test_long_lived_loop_reuses_one_client(self):
+        # What ASGI does: one loop per worker
+        service = DeepSeekAIService()
+        clients = asyncio.run(self.use_client(service, times=3))
+        self.assertTrue(clients[0].is_closed())
+        self.assertIs(clients[1], clients[2])
+        self.assertFalse(clients[1].is_closed())
+
+
+class KeywordAutomatonTests(SimpleTestCase):
+    """The automaton must agree with a plain substring scan"""
+
+    @staticmethod
+    def naive_best_rank(keywords, text):
+        ranks = [rank for keyword, rank in keywords.items() if keyword in text]
+        return min(ranks) if ranks else None
+
+    def test_matches_naive_scan(self):
+        rng = random.Random(1234)
+        # A small alphabet forces overlapping keywords and deep failure links
+        for _ in range(500):
+            keywords = {}
+            for _ in range(rng.randint(1, 8)):
+                keyword = ''.join(rng.choice('abc ') for _ in range(rng.randint(1, 5)))
+                keywords.setdefault(keyword, rng.randint(0, 5))
+            automaton = KeywordAutomaton(keywords)
+            for _ in range(10):
+                text = ''.join(rng.choice('abcd ') for _ in range(rng.randint(0, 30)))
+                self.assertEqual(
+                    automaton.best_rank(text), self.naive_best_rank(keywords, text),
+                    f'keywords={keywords!r} text={text!r}'
+                )
+
+    def test_keyword_inside_another_keyword(self):
+        automaton = KeywordAutomaton({'price list': 1, 'list': 0, 'rice': 2})
+        self.assertEqual(automaton.best_rank('send the price list'), 0)
+        self.assertEqual(automaton.best_rank('basmati rice'), 2)
+        self.assertIsNone(automaton.best_rank(''))
+
+
+class IntentMatcherFuzzyCacheTests(TestCase):
+    def setUp(self):
+        # Seeded by the default intents migration
+        self.intent = ChatIntent.objects.get(name='shipping')
+        self.matcher = IntentMatcher()
+
+    def test_intent_change_drops_cached_fuzzy_results(self):
+        self.assertEqual(self.matcher.match('delivry time')[0], 'shipping')
+        self.assertIn('delivry time', self.matcher._fuzzy_cache)
+
+        # The signal bumps the shared version, so this matcher rebuilds too
+        self.intent.is_active = False
+        self.intent.save()
+        self.assertIsNone(self.matcher.match('delivry time'))
+
+    def test_fuzzy_cache_evicts_least_recently_used(self):
+        self.matcher.fuzzy_cache_size = 2
+        self.matcher.match('delivry time')
+        # None of these contain an exact keyword, so all go through the fuzzy table
+        self.matcher.match('logistcs plz')
+        self.matcher.match('delivry time')
+        self.matcher.match('xyzzy qwerty')
+        self.assertEqual(list(self.matcher._fuzzy_cache), ['delivry time', 'xyzzy qwerty'])
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Concurrent callers for one key must share a single upstream call"""
+
+    key = 'test_singleflight'
+
+    def setUp(self):
+        self.flight = SingleFlight(wait_timeout=5.0, poll_interval=0.01)
+        self.published = {}
+        self.calls = 0
+        self.addCleanup(django_cache.delete, f'{self.key}_inflight')
+
+    def lookup(self):
+        return self.published.get(self.key)
+
+    def compute(self):
+        self.calls += 1
+        time.sleep(0.2)
+        self.published[self.key] = 'answer'
+        return 'answer'
+
+    def run_threads(self, target, count=10):
+        barrier = threading.Barrier(count)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(target())
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_do_runs_once_for_concurrent_threads(self):
+        results = self.run_threads(lambda: self.flight.do(self.key, self.compute, self.lookup))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([result for result, _ in results], ['answer'] * 10)
+        self.assertEqual(sorted(shared for _, shared in results), [False] + [True] * 9)
+        self.assertIsNone(django_cache.get(f'{self.key}_inflight'))
+
+    def test_ado_runs_once_for_concurrent_coroutines(self):
+        async def compute():
+            self.calls += 1
+            await asyncio.sleep(0.2)
+            self.published[self.key] = 'answer'
+            return 'answer'
+
+        async def lookup():
+            return self.lookup()
+
+        async def main():
+            return await asyncio.gather(*(self.flight.ado(self.key, compute, lookup) for _ in range(10)))
+
+        results = asyncio.run(main())
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False] + [True] * 9)
+
+    def other_worker(self, publish):
+        # Holds the cross-worker lock for a while, then releases it
+        django_cache.add(f'{self.key}_inflight', 1, 30)
+
+        def finish():
+            time.sleep(0.2)
+            if publish:
+                self.published[self.key] = 'from other worker'
+            django_cache.delete(f'{self.key}_inflight')
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_do_polls_result_published_by_other_worker(self):
+        self.other_worker(publish=True)
+        self.assertEqual(self.flight.do(self.key, self.compute, self.lookup), ('from other worker', True))
+        self.assertEqual(self.calls, 0)
+
+    def test_ado_polls_result_published_by_other_worker(self):
+        async def compute():
+            self.calls += 1
+            return 'answer'
+
+        async def lookup():
+            return self.lookup()
+
+        self.other_worker(publish=True)
+        self.assertEqual(asyncio.run(self.flight.ado(self.key, compute, lookup)), ('from other worker', True))
+        self.assertEqual(self.calls, 0)
+
+    def test_do_takes_over_when_other_worker_publishes_nothing(self):
+        self.other_worker(publish=False)
+        self.assertEqual(self.flight.do(self.key, self.compute, self.lookup), ('answer', False))
+        self.assertEqual(self.calls, 1)
+
+    def test_do_computes_itself_after_wait_timeout(self):
+        self.flight.wait_timeout = 0.1
+        # Lock held by a worker that never finishes
+        django_cache.add(f'{self.key}_inflight', 1, 30)
+        self.assertEqual(self.flight.do(self.key, self.compute, self.lookup), ('answer', False))
+        self.assertEqual(self.calls, 1)
+
+
+class HotQuestionCacheTests(TestCase):
+    def setUp(self):
+        self.hot = HotQuestionCache()
+        self.addCleanup(django_cache.clear)
+        # Services always miss before they put, which picks up the version
+        self.assertIsNone(self.hot.get('unknown'))
+
+    def entry(self, response):
+        return {'id': 1, 'response': response}
+
+    def test_lru_evicts_least_recently_used(self):
+        self.hot.max_size = 2
+        self.hot.put('a', self.entry('A'))
+        self.hot.put('b', self.entry('B'))
+        self.hot.get('a')
+        self.hot.put('c', self.entry('C'))
+        self.assertEqual(list(self.hot._entries), ['a', 'c'])
+        # Still served by the shared tier, and back in the LRU
+        self.assertEqual(self.hot.get('b'), self.entry('B'))
+        self.assertEqual(list(self.hot._entries), ['c', 'b'])
+
+    def test_lru_entries_expire_after_ttl(self):
+        with mock.patch('chatbot.hot_cache.time.monotonic', return_value=1000.0) as monotonic:
+            self.hot.put('a', self.entry('old'))
+            # Changed in the shared tier behind this worker's back
+            django_cache.set(self.hot._shared_key('a'), self.entry('new'))
+
+            monotonic.return_value = 1000.0 + self.hot.ttl - 1
+            self.assertEqual(self.hot.get('a'), self.entry('old'))
+            monotonic.return_value = 1000.0 + self.hot.ttl + 1
+            self.assertEqual(self.hot.get('a'), self.entry('new'))
+
+    def test_saving_cached_response_invalidates_every_lru(self):
+        question = 'What is the MOQ?'
+        cached = CachedResponse.objects.create(
+            question_hash=CostOptimizedChatbot().get_question_hash(question),
+            question=question, response='One pallet.', intent='faq', confidence=1.0,
+        )
+        self.hot.put(cached.question_hash, self.entry('One pallet.'))
+        self.hot.put('other', self.entry('Other'))
+
+        # The signal goes to the global instance; this one sees the version bump
+        cached.response = 'Half a pallet.'
+        cached.save()
+        self.assertIsNone(self.hot.get(cached.question_hash))
+        self.assertEqual(list(self.hot._entries), [])
+
+    def test_shared_tier_timeout_capped_without_shared_cache(self):
+        with mock.patch('chatbot.hot_cache.cache') as cache:
+            self.hot.put('a', self.entry('A'))
+            with mock.patch('api.catalogue.cache_is_shared', return_value=True):
+                self.hot.put('b', self.entry('B'))
+        self.assertEqual([call.args[2] for call in cache.set.call_args_list], [300, 60 * 60])
+
+
+class DatabaseContextTests(TestCase):
+    """The system prompt's catalogue context is built once per catalogue version"""
+
+    def setUp(self):
+        self.addCleanup(django_cache.clear)
+        self.vertical('Rice')
+        self.service = DeepSeekAIService()
+
+    def vertical(self, title):
+        return Vertical.objects.create(
+            title=title, description=f'{title} from India', icon_name='Wheat', secondary_icon_name='Leaf',
+            gradient='from-amber-500 to-orange-600', bg_gradient='from-amber-50 to-orange-50',
+            image=f'verticals/{title.lower()}.jpg', button_color='bg-amber-600',
+        )
+
+    def test_context_is_memoized_and_shared(self):
+        context = self.service.get_database_context()
+        self.assertIn('- Rice: Rice from India', context)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.service.get_database_context(), context)
+
+        # Another worker reads it from the cache
+        with self.assertNumQueries(0):
+            self.assertEqual(DeepSeekAIService().get_database_context(), context)
+
+    def test_catalogue_change_rebuilds_context(self):
+        self.assertNotIn('Spices', self.service.get_database_context())
+        self.vertical('Spices')
+        self.assertIn('- Spices: Spices from India', self.service.get_database_context())
+
+    def test_memo_expires_with_local_cache(self):
+        # Without a shared cache, version bumps in other workers never arrive
+        with mock.patch('chatbot.deepseek_ai.time.monotonic', return_value=1000.0) as monotonic:
+            context = self.service.get_database_context()
+            # Stands in for this worker's copy expiring and another worker's rebuild
+            django_cache.set(f'ai_database_context_{get_catalogue_version()}', 'rebuilt elsewhere')
+
+            monotonic.return_value = 1000.0 + 299
+            self.assertEqual(self.service.get_database_context(), context)
+            monotonic.return_value = 1000.0 + 301
+            self.assertEqual(self.service.get_database_context(), 'rebuilt elsewhere')
+
+    def test_unavailable_context_is_not_memoized(self):
+        with mock.patch('chatbot.deepseek_ai.Vertical.objects.filter', side_effect=DatabaseError('locked')), \
+                self.assertLogs('chatbot.deepseek_ai', 'ERROR'):
+            self.assertEqual(self.service.get_database_context(), DATABASE_CONTEXT_UNAVAILABLE)
+        self.assertIsNone(self.service._database_context)
+        # The next message tries again
+        self.assertIn('- Rice: Rice from India', self.service.get_database_context())
@@ -9,7 +9,10 @@ router.register(r'sessions', views.ChatSessionViewSet, basename='chat-sessions')
 
 urlpatterns = [
     path('message/', views.chat_message, name='chat-message'),
+    path('message/async/', views.chat_message_async, name='chat-message-async'),
+    path('message/stream/', views.chat_message_stream, name='chat-message-stream'),
     path('ticket/', views.create_chat_ticket, name='create-chat-ticket'),
     path('history/<str:session_id>/', views.chat_history, name='chat-history'),
+    path('stats/ai-cache/', views.ai_cache_stats, name='ai-cache-stats'),
     path('', include(router.urls)),
 ]
@@ -1,7 +1,10 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.http import StreamingHttpResponse, JsonResponse
 from django.utils import timezone
 from django.db.models import Q
 from django.conf import settings
@@ -9,6 +12,7 @@ from django.core.mail import EmailMessage
 import uuid
 import logging
 import json
+from asgiref.sync import sync_to_async
 
 from .models import ChatSession, ChatMessage, ChatTicket, CachedResponse
 from .serializers import (
@@ -17,6 +21,7 @@ from .serializers import (
 )
 from .services import CostOptimizedChatbot
 from .deepseek_ai import deepseek_service
+from .write_behind import chat_writes
 from api.models import Product, CompanyInfo, Vertical
 
 logger = logging.getLogger(__name__)
@@ -45,6 +50,38 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+def get_session_history(session, limit=5):
+    """Return the last few messages of a session in chronological order"""
+    session_messages = ChatMessage.objects.filter(
+        session=session
+    ).order_by('-timestamp')[:limit]
+    # Include this worker's messages that are still waiting to be written
+    session_messages = chat_writes.merge_pending(session, list(reversed(session_messages)), limit)
+    
+    return [
+        {'message_type': msg.message_type, 'content': msg.content}
+        for msg in session_messages
+    ]
+
+
+async def aget_session_history(session, limit=5):
+    """Async version of ``get_session_history``"""
+    session_messages = [
+        msg async for msg in ChatMessage.objects.filter(session=session).order_by('-timestamp')[:limit]
+    ]
+    session_messages = chat_writes.merge_pending(session, list(reversed(session_messages)), limit)
+    
+    return [
+        {'message_type': msg.message_type, 'content': msg.content}
+        for msg in session_messages
+    ]
+
+
+def sse_event(event, data):
+    """Format a Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @api_view(['POST'])
 @csrf_exempt
 def chat_message(request):
@@ -65,7 +102,7 @@ def chat_message(request):
             return Response({'error': 'Invalid session'}, status=status.HTTP_404_NOT_FOUND)
         
         # Save user message
-        user_message = ChatMessage.objects.create(
+        user_message = chat_writes.add_message(
             session=session,
             message_type='user',
             content=message
@@ -77,7 +114,7 @@ def chat_message(request):
         # Check cached response first (FREE)
         cached_response = chatbot.check_cached_response(message)
         if cached_response:
-            bot_message = ChatMessage.objects.create(
+            bot_message = chat_writes.add_message(
                 session=session,
                 message_type='bot',
                 content=cached_response['response'],
@@ -85,7 +122,7 @@ def chat_message(request):
                 confidence=cached_response['confidence'],
                 response_data=cached_response['response_data']
             )
-            session.update_activity()
+            chat_writes.touch_session(session)
             
             return Response({
                 'session_id': session_id,
@@ -114,7 +151,7 @@ def chat_message(request):
         
         # If we have a response, save and return it
         if bot_response:
-            bot_message = ChatMessage.objects.create(
+            bot_message = chat_writes.add_message(
                 session=session,
                 message_type='bot',
                 content=bot_response,
@@ -122,7 +159,7 @@ def chat_message(request):
                 confidence=confidence,
                 response_data=response_data
             )
-            session.update_activity()
+            chat_writes.touch_session(session)
             
             # Cache successful responses
             if confidence >= 0.7:
@@ -146,22 +183,13 @@ def chat_message(request):
                 
                 if use_ai:
                     # Get recent session history for context
-                    session_messages = ChatMessage.objects.filter(
-                        session=session
-                    ).order_by('-timestamp')[:5]  # Last 5 messages
-                    
-                    session_history = []
-                    for msg in reversed(session_messages):  # Chronological order
-                        session_history.append({
-                            'message_type': msg.message_type,
-                            'content': msg.content
-                        })
+                    session_history = get_session_history(session)
                     
                     # Generate AI response
                     ai_result = deepseek_service.generate_ai_response(message, session_history)
                     
                     if ai_result['success']:
-                        bot_message = ChatMessage.objects.create(
+                        bot_message = chat_writes.add_message(
                             session=session,
                             message_type='bot',
                             content=ai_result['response'],
@@ -170,7 +198,7 @@ def chat_message(request):
                             ai_tokens_used=ai_result.get('tokens_used', 0),
                             response_data={'source': 'deepseek_ai', 'cached': ai_result.get('cached', False), 'tokens_used': ai_result.get('tokens_used', 0), 'dynamic_tokens': ai_result.get('dynamic_tokens', 0)}
                         )
-                        session.update_activity()
+                        chat_writes.touch_session(session)
                         
                         return Response({
                             'session_id': session_id,
@@ -185,7 +213,7 @@ def chat_message(request):
                         })
                     else:
                         # Use fallback response if AI fails
-                        bot_message = ChatMessage.objects.create(
+                        bot_message = chat_writes.add_message(
                             session=session,
                             message_type='bot',
                             content=ai_result.get('fallback_response', 'I apologize, but I\'m having trouble understanding. Could you please rephrase your question?'),
@@ -193,7 +221,7 @@ def chat_message(request):
                             confidence=0.6,
                             response_data={'error': ai_result.get('error', 'AI service unavailable')}
                         )
-                        session.update_activity()
+                        chat_writes.touch_session(session)
                         
                         return Response({
                             'session_id': session_id,
@@ -215,7 +243,7 @@ def chat_message(request):
         bot_response = "I'm here to help! You can ask me about:\n\n• **Products**: \"show me rice products\", \"spices\", \"ghee\"\n• **Contact**: \"phone number\", \"address\"\n• **Categories**: \"baked goods\", \"dairy products\"\n• **Pricing**: \"how much for rice\"\n\nWhat would you like to know?"
         confidence = 0.6
         
-        bot_message = ChatMessage.objects.create(
+        bot_message = chat_writes.add_message(
             session=session,
             message_type='bot',
             content=bot_response,
@@ -223,7 +251,7 @@ def chat_message(request):
             confidence=confidence,
             response_data={}
         )
-        session.update_activity()
+        chat_writes.touch_session(session)
         
         return Response({
             'session_id': session_id,
@@ -238,6 +266,232 @@ def chat_message(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+NO_CACHE_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0',
+}
+
+
+@csrf_exempt
+@require_POST
+async def chat_message_async(request):
+    """
+    Async version of ``chat_message``.
+    
+    Under ASGI the worker's event loop keeps serving other requests while
+    the LLM call is in flight, instead of blocking a whole worker process.
+    """
+    try:
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = {}
+        session_id = data.get('session_id')
+        message = (data.get('message') or '').strip()
+        
+        if not session_id or not message:
+            return JsonResponse({
+                'error': 'Session ID and message are required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        session = await ChatSession.objects.filter(session_id=session_id, is_active=True).afirst()
+        if not session:
+            return JsonResponse({'error': 'Invalid session'}, status=status.HTTP_404_NOT_FOUND)
+        
+        await chat_writes.aadd_message(
+            session=session,
+            message_type='user',
+            content=message
+        )
+        
+        # Check cached response first (FREE)
+        chatbot = CostOptimizedChatbot()
+        cached_response = await sync_to_async(chatbot.check_cached_response)(message)
+        if cached_response:
+            bot_message = await chat_writes.aadd_message(
+                session=session,
+                message_type='bot',
+                content=cached_response['response'],
+                intent=cached_response['intent'],
+                confidence=cached_response['confidence'],
+                response_data=cached_response['response_data']
+            )
+            await chat_writes.atouch_session(session)
+            
+            return JsonResponse({
+                'session_id': session_id,
+                'message': ChatMessageSerializer(bot_message).data,
+                'source': 'cache'
+            })
+        
+        if deepseek_service.is_available():
+            session_history = await aget_session_history(session)
+            ai_result = await deepseek_service.agenerate_ai_response(message, session_history)
+            
+            if ai_result['success']:
+                bot_message = await chat_writes.aadd_message(
+                    session=session,
+                    message_type='bot',
+                    content=ai_result['response'],
+                    intent='ai_assisted',
+                    confidence=0.9,
+                    ai_tokens_used=ai_result.get('tokens_used', 0),
+                    response_data={'source': 'deepseek_ai', 'cached': ai_result.get('cached', False), 'tokens_used': ai_result.get('tokens_used', 0), 'dynamic_tokens': ai_result.get('dynamic_tokens', 0)}
+                )
+                source = 'deepseek_ai'
+            else:
+                bot_message = await chat_writes.aadd_message(
+                    session=session,
+                    message_type='bot',
+                    content=ai_result.get('fallback_response', 'I apologize, but I\'m having trouble understanding. Could you please rephrase your question?'),
+                    intent='ai_fallback',
+                    confidence=0.6,
+                    response_data={'error': ai_result.get('error', 'AI service unavailable')}
+                )
+                source = 'ai_fallback'
+            await chat_writes.atouch_session(session)
+            
+            return JsonResponse({
+                'session_id': session_id,
+                'message': ChatMessageSerializer(bot_message).data,
+                'source': source
+            }, headers=NO_CACHE_HEADERS)
+        
+        # Final fallback for unrecognized queries
+        bot_message = await chat_writes.aadd_message(
+            session=session,
+            message_type='bot',
+            content="I'm here to help! You can ask me about:\n\n• **Products**: \"show me rice products\", \"spices\", \"ghee\"\n• **Contact**: \"phone number\", \"address\"\n• **Categories**: \"baked goods\", \"dairy products\"\n• **Pricing**: \"how much for rice\"\n\nWhat would you like to know?",
+            intent='fallback',
+            confidence=0.6,
+            response_data={}
+        )
+        await chat_writes.atouch_session(session)
+        
+        return JsonResponse({
+            'session_id': session_id,
+            'message': ChatMessageSerializer(bot_message).data,
+            'source': 'fallback'
+        })
+        
+    except Exception as e:
+        logger.error(f"Async chat message error: {e}")
+        return JsonResponse({
+            'error': 'An error occurred while processing your message'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@csrf_exempt
+@require_POST
+def chat_message_stream(request):
+    """
+    Stream the bot reply as Server-Sent Events.
+    
+    Emits ``token`` events while the AI response arrives and a final ``done``
+    event carrying the persisted bot message, in the same shape as the JSON
+    ``chat_message`` endpoint.
+    
+    A plain Django view: DRF content negotiation would answer the widget's
+    ``Accept: text/event-stream`` with 406.
+    """
+    try:
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = {}
+        session_id = data.get('session_id')
+        message = (data.get('message') or '').strip()
+        
+        if not session_id or not message:
+            return JsonResponse({
+                'error': 'Session ID and message are required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        session = ChatSession.objects.filter(session_id=session_id, is_active=True).first()
+        if not session:
+            return JsonResponse({'error': 'Invalid session'}, status=status.HTTP_404_NOT_FOUND)
+        
+        chat_writes.add_message(
+            session=session,
+            message_type='user',
+            content=message
+        )
+        
+        chatbot = CostOptimizedChatbot()
+        cached_response = chatbot.check_cached_response(message)
+        session_history = get_session_history(session)
+    except Exception as e:
+        logger.error(f"Chat stream setup error: {e}")
+        return JsonResponse({
+            'error': 'An error occurred while processing your message'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def event_stream():
+        if cached_response:
+            yield sse_event('token', {'content': cached_response['response']})
+            bot_message = chat_writes.add_message(
+                session=session,
+                message_type='bot',
+                content=cached_response['response'],
+                intent=cached_response['intent'],
+                confidence=cached_response['confidence'],
+                response_data=cached_response['response_data']
+            )
+            chat_writes.touch_session(session)
+            yield sse_event('done', {
+                'session_id': session_id,
+                'message': ChatMessageSerializer(bot_message).data,
+                'source': 'cache'
+            })
+            return
+        
+        ai_result = None
+        try:
+            for event in deepseek_service.stream_ai_response(message, session_history):
+                if event['type'] == 'token':
+                    yield sse_event('token', {'content': event['content']})
+                elif event['type'] == 'done':
+                    ai_result = event['result']
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}")
+        
+        # Persist the full reply once the stream has ended
+        if ai_result and ai_result['success']:
+            bot_message = chat_writes.add_message(
+                session=session,
+                message_type='bot',
+                content=ai_result['response'],
+                intent='ai_assisted',
+                confidence=0.9,
+                ai_tokens_used=ai_result.get('tokens_used', 0),
+                response_data={'source': 'deepseek_ai', 'cached': ai_result.get('cached', False), 'tokens_used': ai_result.get('tokens_used', 0), 'dynamic_tokens': ai_result.get('dynamic_tokens', 0), 'streamed': True}
+            )
+            source = 'deepseek_ai'
+        else:
+            ai_result = ai_result or {}
+            bot_message = chat_writes.add_message(
+                session=session,
+                message_type='bot',
+                content=ai_result.get('fallback_response', 'I apologize, but I\'m having trouble understanding. Could you please rephrase your question?'),
+                intent='ai_fallback',
+                confidence=0.6,
+                response_data={'error': ai_result.get('error', 'AI service unavailable')}
+            )
+            source = 'ai_fallback'
+        chat_writes.touch_session(session)
+        
+        yield sse_event('done', {
+            'session_id': session_id,
+            'message': ChatMessageSerializer(bot_message).data,
+            'source': source
+        })
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+
 @api_view(['POST'])
 @csrf_exempt
 def create_chat_ticket(request):
@@ -310,7 +564,7 @@ def chat_history(request, session_id):
         if not session:
             return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        messages = session.messages.all().order_by('timestamp')
+        messages = chat_writes.merge_pending(session, list(session.messages.all().order_by('timestamp')))
         serializer = ChatMessageSerializer(messages, many=True)
         
         return Response({
@@ -323,3 +577,9 @@ def chat_history(request, session_id):
         return Response({
             'error': 'Failed to retrieve chat history'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@staff_member_required
+def ai_cache_stats(request):
+    """AI response cache hits, misses, hit rate and tokens saved, for staff"""
+    return JsonResponse(deepseek_service.response_cache.stats())
@@ -0,0 +1,222 @@
+"""
+Write-behind persistence for chat traffic.
+
+Chat views hand new ChatMessages, session activity and CachedResponse hits
+to a per-worker buffer instead of writing them on the request path. A
+background thread flushes the buffer every few seconds with one
+``bulk_create``, one ``bulk_update`` and atomic ``F()`` increments for the
+usage counters, and the buffer is flushed again when the worker exits. Reads of recent
+history merge in the messages that have not been flushed yet. If the database
+rejects a batch, its messages are written one by one and only the rejected
+ones are dropped (and logged).
+
+Messages returned by the chat endpoints before their flush have no ``id``
+yet (``null`` in the JSON, see CHATBOT_SETUP.md).
+
+Set ``CHAT_WRITE_BEHIND = False`` to write synchronously (e.g. in tests).
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import CachedResponse, ChatMessage, ChatSession
+
+logger = logging.getLogger(__name__)
+
+
+class ChatWriteBuffer:
+    """Buffers chat writes and flushes them in batches"""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'CHAT_WRITE_BEHIND', True)
+        self.flush_interval = getattr(settings, 'CHAT_WRITE_BEHIND_INTERVAL', 2.0)
+        self.max_pending = getattr(settings, 'CHAT_WRITE_BEHIND_MAX_PENDING', 200)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._messages: List[ChatMessage] = []
+        self._in_flight: List[ChatMessage] = []
+        self._activity: Dict[int, object] = {}  # session pk -> last activity
+        self._hits: Counter = Counter()  # CachedResponse pk -> hits since last flush
+        self._wakeup = threading.Event()
+        self._pid = None
+        atexit.register(self.flush)
+
+    def _ensure_flusher(self):
+        # Started lazily, and again after a fork, so each worker has its own thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+            thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def add_message(self, **fields) -> ChatMessage:
+        """Queue a ChatMessage for creation and return the (unsaved) instance"""
+        message = ChatMessage(**fields)
+        if not self.enabled:
+            message.save()
+            return message
+
+        self._ensure_flusher()
+        with self._lock:
+            self._messages.append(message)
+            full = len(self._messages) >= self.max_pending
+        if full:
+            self._wakeup.set()
+        return message
+
+    async def aadd_message(self, **fields) -> ChatMessage:
+        """Async version of ``add_message``"""
+        if not self.enabled:
+            return await ChatMessage.objects.acreate(**fields)
+        return self.add_message(**fields)
+
+    def touch_session(self, session: ChatSession):
+        """Record activity on a session; the row is updated on the next flush"""
+        if not self.enabled:
+            session.update_activity()
+            return
+
+        session.last_activity = timezone.now()
+        self._ensure_flusher()
+        with self._lock:
+            self._activity[session.pk] = session.last_activity
+
+    async def atouch_session(self, session: ChatSession):
+        """Async version of ``touch_session``"""
+        if not self.enabled:
+            await session.aupdate_activity()
+            return
+        self.touch_session(session)
+
+    def record_cache_hit(self, cached_response_id: int):
+        """Count a CachedResponse hit; folded into usage_count on the next flush"""
+        if not self.enabled:
+            CachedResponse.objects.filter(id=cached_response_id).update(
+                usage_count=F('usage_count') + 1, last_used=timezone.now()
+            )
+            return
+
+        self._ensure_flusher()
+        with self._lock:
+            self._hits[cached_response_id] += 1
+
+    def _apply_hits(self, hits: Counter):
+        # One UPDATE per distinct increment; F() keeps concurrent workers from losing counts
+        by_count = defaultdict(list)
+        for pk, count in hits.items():
+            by_count[count].append(pk)
+        now = timezone.now()
+        for count, pks in by_count.items():
+            CachedResponse.objects.filter(id__in=pks).update(
+                usage_count=F('usage_count') + count, last_used=now
+            )
+
+    def pending_messages(self, session: ChatSession) -> List[ChatMessage]:
+        """Messages for ``session`` that may not be in the database yet"""
+        with self._lock:
+            return [m for m in self._in_flight + self._messages if m.session_id == session.pk]
+
+    def merge_pending(self, session: ChatSession, messages: List[ChatMessage], limit: int = None) -> List[ChatMessage]:
+        """Merge pending messages into ``messages`` (chronological), keeping the last ``limit``"""
+        stored = {m.pk for m in messages}
+        merged = list(messages) + [
+            m for m in self.pending_messages(session) if m.pk is None or m.pk not in stored
+        ]
+        merged.sort(key=lambda m: m.timestamp)
+        return merged[-limit:] if limit else merged
+
+    def _write(self, messages: List[ChatMessage], activity: Dict[int, object], hits: Counter):
+        with transaction.atomic():
+            if messages:
+                ChatMessage.objects.bulk_create(messages)
+            if activity:
+                ChatSession.objects.bulk_update(
+                    [ChatSession(pk=pk, last_activity=last_activity) for pk, last_activity in activity.items()],
+                    ['last_activity']
+                )
+            if hits:
+                self._apply_hits(hits)
+
+    def _write_rows(self, messages: List[ChatMessage]):
+        """
+        Write ``messages`` one at a time, dropping the ones the database
+        rejects. Each message is removed from the list once it is written or
+        dropped, so on any other error the list holds what is left to retry.
+        """
+        while messages:
+            message = messages[0]
+            try:
+                with transaction.atomic():
+                    ChatMessage.objects.bulk_create([message])
+            except (DataError, IntegrityError) as e:
+                message.pk = None
+                logger.error(
+                    f"Chat write-behind dropped a {message.message_type} message for session "
+                    f"{message.session_id} ({message.content[:50]!r}): {e}"
+                )
+            messages.pop(0)
+
+    def flush(self):
+        """Write everything buffered so far"""
+        with self._flush_lock:
+            with self._lock:
+                messages, self._messages = self._messages, []
+                activity, self._activity = self._activity, {}
+                hits, self._hits = self._hits, Counter()
+                self._in_flight = messages
+            if not messages and not activity and not hits:
+                return
+
+            close_old_connections()
+            unwritten = list(messages)
+            try:
+                try:
+                    self._write(messages, activity, hits)
+                    unwritten = []
+                except (DataError, IntegrityError) as e:
+                    # One bad row (e.g. a message whose session was deleted
+                    # while it waited) fails the whole batch, and would fail
+                    # every later flush too; only that row is dropped.
+                    # Activity and hits can't violate constraints: updates
+                    # of deleted rows match nothing
+                    logger.warning(f"Chat write-behind batch rejected, writing messages one by one: {e}")
+                    for message in messages:
+                        message.pk = None
+                    self._write_rows(unwritten)
+                    self._write([], activity, hits)
+            except Exception as e:
+                for message in unwritten:
+                    message.pk = None
+                with self._lock:
+                    if len(self._messages) + len(unwritten) > self.max_pending * 10:
+                        # Don't grow without bound while the database is unavailable
+                        logger.error(f"Chat write-behind flush failed, dropping {len(unwritten)} messages: {e}")
+                    else:
+                        logger.error(f"Chat write-behind flush failed, will retry: {e}")
+                        self._messages = unwritten + self._messages
+                        for pk, last_activity in activity.items():
+                            self._activity.setdefault(pk, last_activity)
+                        self._hits.update(hits)
+            finally:
+                with self._lock:
+                    self._in_flight = []
+
+
+# Global instance, one per worker process
+chat_writes = ChatWriteBuffer()
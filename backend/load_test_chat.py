@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Concurrent chat load test against a local mock LLM.
+
+Compares the sync chat endpoint under WSGI workers with the async endpoint
+under ASGI workers. Each virtual user opens its own chat session and sends
+unique messages, so the AI response cache never short-circuits the LLM call.
+
+Before (WSGI, sync endpoint):
+    python mock_llm_server.py --first-token-delay 2 &
+    DEEPSEEK_API_KEY=test DEEPSEEK_API_BASE=http://127.0.0.1:8765/v1 \\
+        gunicorn backend.wsgi:application --workers 3 --bind 127.0.0.1:8000 &
+    python load_test_chat.py --endpoint message/ --concurrency 100
+
+After (ASGI, async endpoint):
+    DEEPSEEK_API_KEY=test DEEPSEEK_API_BASE=http://127.0.0.1:8765/v1 \\
+        gunicorn backend.asgi:application --workers 3 \\
+        --worker-class uvicorn.workers.UvicornWorker --bind 127.0.0.1:8000 &
+    python load_test_chat.py --endpoint message/async/ --concurrency 100
+"""
+
+import argparse
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def run_user(base_url, endpoint, messages_per_user, results, lock):
+    http = requests.Session()
+    try:
+        session_id = http.post(f"{base_url}/sessions/", json={}, timeout=60).json()['session_id']
+    except Exception as e:
+        with lock:
+            results['errors'].append(f"session: {e}")
+        return
+
+    for i in range(messages_per_user):
+        message = f"Tell me about your basmati rice export options ({uuid.uuid4().hex[:8]})"
+        started = time.perf_counter()
+        try:
+            response = http.post(
+                f"{base_url}/{endpoint}",
+                json={'session_id': session_id, 'message': message},
+                timeout=120
+            )
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.status_code == 200:
+                    results['latencies'].append(elapsed)
+                    source = response.json().get('source', 'unknown')
+                    results['sources'][source] = results['sources'].get(source, 0) + 1
+                else:
+                    results['errors'].append(f"HTTP {response.status_code}")
+        except Exception as e:
+            with lock:
+                results['errors'].append(str(e))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent chat load test')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/chat')
+    parser.add_argument('--endpoint', default='message/', help="'message/' (sync) or 'message/async/'")
+    parser.add_argument('--concurrency', type=int, default=50, help='Concurrent chat users')
+    parser.add_argument('--messages', type=int, default=2, help='Messages per user')
+    args = parser.parse_args()
+
+    results = {'latencies': [], 'errors': [], 'sources': {}}
+    lock = threading.Lock()
+
+    print(f"🚀 {args.concurrency} users x {args.messages} messages -> {args.base_url}/{args.endpoint}")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for _ in range(args.concurrency):
+            pool.submit(run_user, args.base_url, args.endpoint, args.messages, results, lock)
+    wall = time.perf_counter() - started
+
+    latencies = results['latencies']
+    print("=" * 50)
+    print(f"Completed:   {len(latencies)} messages in {wall:.2f}s")
+    print(f"Throughput:  {len(latencies) / wall:.2f} messages/s")
+    if latencies:
+        print(f"Latency p50: {statistics.median(latencies):.2f}s")
+        print(f"Latency p95: {percentile(latencies, 95):.2f}s")
+        print(f"Latency max: {max(latencies):.2f}s")
+    print(f"Sources:     {results['sources']}")
+    print(f"Errors:      {len(results['errors'])}")
+    for error in results['errors'][:5]:
+        print(f"  - {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Local fake OpenAI-compatible chat completions server for testing the chatbot
+without calling (or paying for) DeepSeek.
+
+Usage:
+    python mock_llm_server.py --port 8765 --token-delay 0.05
+
+Then run Django with:
+    DEEPSEEK_API_KEY=test DEEPSEEK_API_BASE=http://127.0.0.1:8765/v1 python manage.py runserver
+"""
+
+import argparse
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = (
+    "Thanks for reaching out to Westend Corporation! We export premium rice, "
+    "spices, ghee and baked goods worldwide. Tell me which products you are "
+    "interested in and I'll share the details."
+)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    token_delay = 0.05
+    first_token_delay = 0.2
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # Keep load tests quiet
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        prompt_tokens = sum(len(m.get('content', '')) for m in body.get('messages', [])) // 4
+        words = REPLY.split(' ')
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get('model', 'mock-model')
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(words),
+            'total_tokens': prompt_tokens + len(words),
+        }
+
+        time.sleep(self.first_token_delay)
+
+        if body.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for i, word in enumerate(words):
+                chunk = {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{
+                        'index': 0,
+                        'delta': {'role': 'assistant', 'content': word if i == 0 else f" {word}"},
+                        'finish_reason': None,
+                    }],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(self.token_delay)
+            final = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+                'usage': usage,
+            }
+            self.wfile.write(f"data: {json.dumps(final)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        time.sleep(self.token_delay * len(words))
+        payload = json.dumps({
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': REPLY},
+                'finish_reason': 'stop',
+            }],
+            'usage': usage,
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake OpenAI-compatible server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--token-delay', type=float, default=0.05, help='Seconds between streamed tokens')
+    parser.add_argument('--first-token-delay', type=float, default=0.2, help='Seconds before the first token')
+    args = parser.parse_args()
+
+    MockLLMHandler.token_delay = args.token_delay
+    MockLLMHandler.first_token_delay = args.first_token_delay
+    server = ThreadingHTTPServer((args.host, args.port), MockLLMHandler)
+    print(f"🤖 Mock LLM listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@
 import requests
 import json
 import sys
+import time
 
 # Disable SSL warnings
 requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
@@ -83,5 +84,49 @@ def test_chatbot():
     print("🎉 Chatbot API test completed!")
     return True
 
+def test_chat_stream():
+    """Check the SSE endpoint relays tokens (run Django against mock_llm_server.py)"""
+    base_url = "http://127.0.0.1:8000/api/chat"
+    
+    print("\n📡 Testing streaming chat endpoint")
+    print("=" * 50)
+    
+    try:
+        response = requests.post(f"{base_url}/sessions/", json={})
+        session_id = response.json()['session_id']
+        
+        started = time.time()
+        first_token_at = None
+        tokens = 0
+        done = None
+        
+        with requests.post(f"{base_url}/message/stream/",
+                           json={'session_id': session_id, 'message': 'tell me about your basmati rice'},
+                           stream=True) as response:
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith('event: '):
+                    event = line[len('event: '):]
+                elif line.startswith('data: '):
+                    data = json.loads(line[len('data: '):])
+                    if event == 'token':
+                        tokens += 1
+                        if first_token_at is None:
+                            first_token_at = time.time() - started
+                    elif event == 'done':
+                        done = data
+        
+        total = time.time() - started
+        if done:
+            print(f"✅ {tokens} token events, first after {first_token_at or 0:.2f}s, done after {total:.2f}s")
+            print(f"   Source: {done.get('source')}")
+            print(f"   Saved message: {done['message']['content'][:80]}...")
+            return True
+        print("❌ Stream ended without a done event")
+    except Exception as e:
+        print(f"❌ Streaming error: {e}")
+    return False
+
 if __name__ == "__main__":
     test_chatbot()
+    test_chat_stream()
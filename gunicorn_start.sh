@@ -8,6 +8,10 @@ WORKERS=3
 BIND=127.0.0.1:8000
 DJANGO_SETTINGS_MODULE=backend.settings
 DJANGO_WSGI_MODULE=backend.wsgi
+DJANGO_ASGI_MODULE=backend.asgi
+# Set SERVER_MODE=asgi to run Uvicorn workers, so slow AI calls on the
+# async chat endpoint (/api/chat/message/async/) don't pin a worker process
+SERVER_MODE=${SERVER_MODE:-wsgi}
 LOGLEVEL=info
 
 cd $DJANGODIR
@@ -16,7 +20,15 @@ source venv/bin/activate
 export DJANGO_SETTINGS_MODULE=$DJANGO_SETTINGS_MODULE
 export PYTHONPATH=$DJANGODIR:$PYTHONPATH
 
-exec venv/bin/gunicorn ${DJANGO_WSGI_MODULE}:application \
+if [ "$SERVER_MODE" = "asgi" ]; then
+  APP_MODULE=${DJANGO_ASGI_MODULE}:application
+  WORKER_ARGS="--worker-class uvicorn.workers.UvicornWorker"
+else
+  APP_MODULE=${DJANGO_WSGI_MODULE}:application
+  WORKER_ARGS=""
+fi
+
+exec venv/bin/gunicorn $APP_MODULE $WORKER_ARGS \
   --name $NAME \
   --workers $WORKERS \
   --user=$USER \
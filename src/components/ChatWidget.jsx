@@ -231,6 +231,49 @@ const ChatWidget = () => {
     addUserMessage(message);
     setIsTyping(true);
 
+    const streamId = Date.now() + 1;
+    let streamed = '';
+
+    try {
+      // Show the reply as it is generated
+      const response = await chatbotService.sendMessageStream(message, (token) => {
+        if (!streamed) {
+          setIsTyping(false);
+          setMessages(prev => [...prev, {
+            id: streamId,
+            content: '',
+            message_type: 'bot',
+            timestamp: new Date().toISOString(),
+            response_data: {}
+          }]);
+        }
+        streamed += token;
+        const content = streamed;
+        setMessages(prev => prev.map(m => (m.id === streamId ? { ...m, content } : m)));
+      });
+
+      // Swap the raw streamed text for the cleaned, saved reply
+      setMessages(prev => prev.filter(m => m.id !== streamId));
+      addBotMessage(response.message.content, response.message.response_data);
+      setIsTyping(false);
+      inputRef.current?.focus();
+      return;
+    } catch (streamError) {
+      if (streamError.streamStarted) {
+        // The message already reached the server; re-sending it would store
+        // it twice and pay for a second AI reply
+        console.error('Chat stream interrupted:', streamError);
+        setIsTyping(false);
+        if (!streamed) {
+          addBotMessage("I'm having trouble connecting right now. Please try again or contact our support team directly.");
+        }
+        return;
+      }
+      console.warn('Streaming unavailable, falling back to JSON endpoint:', streamError);
+      setMessages(prev => prev.filter(m => m.id !== streamId));
+      setIsTyping(true);
+    }
+
     try {
       console.log('📤 Sending message via chatbot service:', message);
       const response = await chatbotService.sendMessage(message);
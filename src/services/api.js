@@ -80,10 +80,31 @@ export const getProducts = async (params = {}) => {
   return response.results || response;
 };
 
+// Keyset-paginated products for infinite scroll.
+// Pass the `next` URL from the previous page to continue; returns { results, next }.
+export const getProductPage = async ({ next = null, pageSize = 24, ...params } = {}) => {
+  if (next) {
+    const response = await fetch(next, { headers: { 'Accept': 'application/json' }, mode: 'cors' });
+    if (!response.ok) {
+      throw new Error(`API Error: ${response.status} ${response.statusText}`);
+    }
+    return response.json();
+  }
+  const queryString = new URLSearchParams({ ...params, pagination: 'cursor', page_size: pageSize }).toString();
+  return apiCall(`/products/?${queryString}`);
+};
+
 export const getProductBySlug = async (slug) => {
   return apiCall(`/products/${slug}/`);
 };
 
+// Fetch several products in one request; results come back in the order given
+export const getProductsBySlugs = async (slugs = []) => {
+  if (!slugs.length) return [];
+  const response = await apiCall(`/products/batch/?slugs=${slugs.map(encodeURIComponent).join(',')}`);
+  return response.results || [];
+};
+
 // Alias for backward compatibility if needed, though we should migrate to slug
 export const getProductById = getProductBySlug;
 
@@ -176,6 +197,20 @@ export const submitPageVisit = async (data = {}) => {
   }
 };
 
+// Several tracking events in one request (max 50)
+export const submitPageVisits = async (events = []) => {
+  if (!events.length) return null;
+  try {
+    return await apiCall('/page-visit/', {
+      method: 'POST',
+      body: JSON.stringify({ events }),
+    });
+  } catch (error) {
+    console.warn('Page visit tracking failed', error);
+    return null;
+  }
+};
+
 export const getCertifications = async () => {
   const response = await apiCall('/certifications/');
   return response.results || response;
@@ -195,12 +230,14 @@ export default {
   getVerticals,
   getProducts,
   getProductBySlug,
+  getProductsBySlugs,
   getProductsByCategory,
   submitContactForm,
   submitQuoteRequest,
   getFeatures,
   getCompanyInfo,
   recordPageVisit: submitPageVisit,
+  recordPageVisits: submitPageVisits,
   getHeroSlides,
   getCertifications,
   getPageBackgrounds,
@@ -226,6 +226,84 @@ class ChatbotAPI {
     }
   }
 
+  // Stream the reply over Server-Sent Events, calling onToken as text arrives.
+  // Resolves with the same shape as sendMessage once the server sends "done".
+  async sendMessageStream(message, onToken) {
+    // Local intents are answered without a round trip, same as sendMessage
+    const localIntent = this.detectIntentLocally(message);
+    if (localIntent && this.generateLocalResponse(localIntent, message)) {
+      return this.sendMessage(message);
+    }
+
+    const sessionId = await this.getSessionId();
+
+    const response = await fetch(`${API_BASE_URL}/chat/message/stream/`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
+        'Cache-Control': 'no-cache'
+      },
+      body: JSON.stringify({
+        session_id: sessionId,
+        message: message
+      })
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`API Error: ${response.status}`);
+    }
+
+    // From here on the server has saved the user message (and may be paying
+    // for an AI reply), so callers must not retry on the JSON endpoint
+    try {
+      return await this.readEventStream(response, onToken);
+    } catch (error) {
+      error.streamStarted = true;
+      throw error;
+    }
+  }
+
+  async readEventStream(response, onToken) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE frames are separated by a blank line
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        for (const line of frame.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        if (!data) continue;
+
+        const payload = JSON.parse(data);
+        if (event === 'token' && onToken) {
+          onToken(payload.content);
+        } else if (event === 'done') {
+          result = payload;
+        }
+      }
+    }
+
+    if (!result) {
+      throw new Error('Stream ended unexpectedly');
+    }
+    return { ...result, cost: result.source === 'ai_fallback' ? 1 : 0.1 };
+  }
+
   async createTicket(ticketData) {
     try {
       const sessionId = await this.getSessionId();